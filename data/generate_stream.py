@@ -1,12 +1,311 @@
 """
 Generate synthetic stream data for initial experiments.
 Can be replaced later with real Common Crawl data.
+
+Streams are generated as integer ID arrays in chunks from a seeded NumPy
+Generator, so load-test streams of 10^9 items take seconds per billion
+rather than hours. IDs are written either to a memory-mapped .npy file
+(np.load(path, mmap_mode='r') replays it without loading it) or, for the
+line-per-item experiments, to a text file of item names.
 """
 
-import random
 import os
+import random
+import sys
+from functools import partial
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from experiments.samplers import ZipfSampler
+
+CHUNK_SIZE = 1 << 22  # IDs generated (and written) per chunk
+SEGMENT_BATCH_ITEMS = 1 << 20  # Approximate items per vectorized batch of bursty segments
+DISTRIBUTIONS = ('uniform', 'hot_cold', 'zipf', 'bursty')
+BURST_LENGTHS = ('geometric', 'pareto', 'fixed')
+
+
+def id_dtype(universe):
+    """Smallest unsigned integer dtype that holds IDs in [0, universe)."""
+    return np.uint32 if universe <= (1 << 32) else np.uint64
+
 
-def generate_synthetic_stream(n_elements=100000, n_unique=30000, output_file="stream.txt"):
+def uniform_ids(n_elements, n_unique, seed=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield chunks of IDs drawn uniformly from [0, n_unique).
+    
+    Args:
+        n_elements: Total number of IDs
+        n_unique: Size of the ID universe
+        seed: Seed of the NumPy Generator
+        chunk_size: IDs per chunk
+    
+    Yields:
+        ID arrays of at most chunk_size items
+    """
+    rng = np.random.default_rng(seed)
+    dtype = id_dtype(n_unique)
+    for start in range(0, n_elements, chunk_size):
+        size = min(chunk_size, n_elements - start)
+        yield rng.integers(0, n_unique, size=size, dtype=dtype)
+
+
+def hot_cold_ids(n_elements, hot_set_size=100, cold_set_size=50000, hot_ratio=0.8,
+                 seed=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield chunks of IDs from a hot set with probability hot_ratio, else a cold set.
+    
+    Hot items are IDs [0, hot_set_size) and cold items follow them (see
+    hot_cold_vocab).
+    
+    Args:
+        n_elements: Total number of IDs
+        hot_set_size: Number of popular items
+        cold_set_size: Number of unpopular items
+        hot_ratio: Fraction of traffic from the hot set
+        seed: Seed of the NumPy Generator
+        chunk_size: IDs per chunk
+    
+    Yields:
+        ID arrays of at most chunk_size items
+    """
+    rng = np.random.default_rng(seed)
+    dtype = id_dtype(hot_set_size + cold_set_size)
+    for start in range(0, n_elements, chunk_size):
+        size = min(chunk_size, n_elements - start)
+        ids = rng.integers(hot_set_size, hot_set_size + cold_set_size, size=size, dtype=dtype)
+        hot = rng.random(size) < hot_ratio
+        ids[hot] = rng.integers(0, hot_set_size, size=int(np.count_nonzero(hot)), dtype=dtype)
+        yield ids
+
+
+def zipf_ids(n_elements, n_unique, exponent=1.0, seed=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield chunks of Zipf-distributed IDs: P(rank k) ~ 1 / (k+1)^exponent.
+    
+    Sampled by inverse CDF (see experiments.samplers.ZipfSampler), so any
+    exponent >= 0 works on a finite universe.
+    
+    Args:
+        n_elements: Total number of IDs
+        n_unique: Number of ranks (ID k is rank k+1)
+        exponent: Zipf exponent (1.0 = standard Zipf)
+        seed: Seed of the NumPy Generator
+        chunk_size: IDs per chunk
+    
+    Yields:
+        ID arrays of at most chunk_size items
+    """
+    rng = np.random.default_rng(seed)
+    dtype = id_dtype(n_unique)
+    sampler = ZipfSampler(n_unique, exponent)
+    for start in range(0, n_elements, chunk_size):
+        size = min(chunk_size, n_elements - start)
+        yield sampler.sample(size, rng).astype(dtype)
+
+
+def burst_lengths(rng, size, distribution='geometric', mean=50, shape=1.5):
+    """
+    Draw burst lengths (items per burst, at least 1).
+    
+    Args:
+        rng: NumPy Generator
+        size: Number of bursts
+        distribution: 'geometric', 'pareto' (heavy-tailed Lomax) or 'fixed'
+        mean: Mean burst length (approximate for 'pareto')
+        shape: Tail index of 'pareto' (> 1; smaller is heavier)
+    
+    Returns:
+        int64 array of lengths
+    """
+    if distribution == 'geometric':
+        return rng.geometric(1.0 / max(mean, 1), size)
+    if distribution == 'pareto':
+        # numpy's pareto() is Lomax with mean 1 / (shape - 1)
+        lengths = 1 + np.rint(rng.pareto(shape, size) * (mean - 1) * (shape - 1))
+        return np.minimum(lengths, 1 << 40).astype(np.int64)
+    if distribution == 'fixed':
+        return np.full(size, max(int(mean), 1), dtype=np.int64)
+    raise ValueError(f"Unknown burst length distribution: {distribution} (expected one of {BURST_LENGTHS})")
+
+
+def bursty_ids(n_elements, n_unique=50000, hot_set_size=100, quiet_mean=200, burst_mean=50,
+               burst_length='geometric', burst_shape=1.5, drift=0.0, diurnal_period=None,
+               diurnal_amplitude=0.0, seed=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield chunks of IDs from a Markov-modulated quiet/burst process.
+    
+    The stream alternates between quiet periods of uniformly random IDs
+    (geometric lengths) and bursts that repeat one key drawn from the
+    current hot set. The hot set is hot_set_size consecutive IDs whose
+    start slides by `drift` IDs per item (wrapping around the universe),
+    and the burst rate follows a diurnal curve: quiet periods shrink by
+    a factor 1 + diurnal_amplitude * sin(2 pi t / diurnal_period).
+    
+    Segments are drawn in vectorized batches (independent of chunk_size,
+    so the stream depends only on the seed); the diurnal rate is held
+    constant within a batch, which spans about 1/64 of a period.
+    
+    Args:
+        n_elements: Total number of IDs
+        n_unique: Size of the ID universe
+        hot_set_size: Keys a burst can pick from at any time
+        quiet_mean: Mean quiet period length (items) at the base rate
+        burst_mean: Mean burst length (items)
+        burst_length: 'geometric', 'pareto' or 'fixed' (see burst_lengths)
+        burst_shape: Tail index for 'pareto' burst lengths
+        drift: Hot set shift in IDs per item (0 = fixed hot set)
+        diurnal_period: Items per rate cycle (None = constant rate)
+        diurnal_amplitude: Relative rate swing in [0, 1)
+        seed: Seed of the NumPy Generator
+        chunk_size: IDs per chunk
+    
+    Yields:
+        ID arrays of chunk_size items (the last one may be shorter)
+    """
+    if not 0 <= diurnal_amplitude < 1:
+        raise ValueError("diurnal_amplitude must be in [0, 1)")
+    
+    rng = np.random.default_rng(seed)
+    dtype = id_dtype(n_unique)
+    segment_items = quiet_mean + burst_mean
+    if diurnal_period:
+        per_batch = max(1, int(diurnal_period / (64 * segment_items)))
+    else:
+        per_batch = max(1, int(SEGMENT_BATCH_ITEMS / segment_items))
+    is_quiet = np.tile([True, False], per_batch)
+    
+    pending = np.empty(0, dtype=dtype)
+    position = 0  # Items generated so far
+    emitted = 0
+    while emitted < n_elements:
+        need = min(chunk_size, n_elements - emitted)
+        parts = [pending]
+        available = len(pending)
+        while available < need:
+            rate = 1.0
+            if diurnal_period:
+                rate += diurnal_amplitude * np.sin(2 * np.pi * position / diurnal_period)
+            quiet = rng.geometric(min(1.0, rate / max(quiet_mean, 1)), per_batch)
+            bursts = burst_lengths(rng, per_batch, burst_length, burst_mean, burst_shape)
+            lengths = np.column_stack([quiet, bursts]).ravel()
+            
+            # Each burst repeats a hot-set key chosen where the burst starts
+            burst_start = position + np.cumsum(lengths)[0::2]
+            offset = np.floor(burst_start * drift).astype(np.int64)
+            keys = (offset + rng.integers(0, hot_set_size, per_batch)) % n_unique
+            
+            values = np.column_stack([np.zeros(per_batch, dtype=np.int64), keys]).ravel()
+            ids = np.repeat(values, lengths).astype(dtype)
+            quiet_items = np.repeat(is_quiet, lengths)
+            ids[quiet_items] = rng.integers(0, n_unique, size=int(lengths[0::2].sum()), dtype=dtype)
+            
+            parts.append(ids)
+            available += len(ids)
+            position += len(ids)
+        
+        pending = np.concatenate(parts)
+        yield pending[:need]
+        pending = pending[need:]
+        emitted += need
+
+
+def uniform_vocab(n_unique):
+    """Item names of uniform, Zipf and bursty IDs."""
+    return [f"item_{i}" for i in range(n_unique)]
+
+
+def hot_cold_vocab(hot_set_size=100, cold_set_size=50000):
+    """Item names of hot_cold_ids() IDs."""
+    return [f"hot_{i}" for i in range(hot_set_size)] + [f"cold_{i}" for i in range(cold_set_size)]
+
+
+def write_ids(chunks, output_file, n_elements, universe, vocab=None):
+    """
+    Write ID chunks to disk and count distinct IDs exactly.
+    
+    A .npy output_file is a memory-mapped array of IDs; any other path
+    gets one item name (vocab[id]) per line, the format of stream.txt.
+    
+    Args:
+        chunks: Iterable of ID arrays totalling n_elements
+        output_file: Destination path
+        n_elements: Total number of IDs
+        universe: Size of the ID universe
+        vocab: Item names, required for text output
+    
+    Returns:
+        Number of distinct IDs written
+    """
+    seen = np.zeros(universe, dtype=bool)
+    
+    if output_file.endswith('.npy'):
+        out = np.lib.format.open_memmap(output_file, mode='w+', dtype=id_dtype(universe), shape=(n_elements,))
+        start = 0
+        for ids in chunks:
+            out[start:start + len(ids)] = ids
+            seen[ids] = True
+            start += len(ids)
+        out.flush()
+        del out
+    else:
+        names = np.asarray(vocab, dtype=object)
+        with open(output_file, "w") as f:
+            for ids in chunks:
+                f.write("\n".join(names[ids].tolist()))
+                f.write("\n")
+                seen[ids] = True
+    
+    return int(np.count_nonzero(seen))
+
+
+def generate_id_stream(output_file, n_elements, distribution='uniform', seed=None,
+                       chunk_size=CHUNK_SIZE, **params):
+    """
+    Generate a synthetic stream of any size in chunks and write it to disk.
+    
+    Args:
+        output_file: .npy for a memory-mapped ID array, else a text stream
+        n_elements: Total number of items
+        distribution: 'uniform' (n_unique), 'hot_cold' (hot_set_size,
+                      cold_set_size, hot_ratio), 'zipf' (n_unique, exponent)
+                      or 'bursty' (n_unique and the bursty_ids parameters)
+        seed: Seed of the NumPy Generator
+        chunk_size: IDs generated per chunk
+        **params: Parameters of the distribution
+    
+    Returns:
+        Dict with n_elements, universe and the exact distinct count
+    """
+    if distribution == 'uniform':
+        universe = params.get('n_unique', 30000)
+        chunks = uniform_ids(n_elements, universe, seed, chunk_size)
+        make_vocab = partial(uniform_vocab, universe)
+    elif distribution == 'hot_cold':
+        hot_set_size = params.get('hot_set_size', 100)
+        cold_set_size = params.get('cold_set_size', 50000)
+        universe = hot_set_size + cold_set_size
+        chunks = hot_cold_ids(n_elements, hot_set_size, cold_set_size,
+                              params.get('hot_ratio', 0.8), seed, chunk_size)
+        make_vocab = partial(hot_cold_vocab, hot_set_size, cold_set_size)
+    elif distribution == 'zipf':
+        universe = params.get('n_unique', 30000)
+        chunks = zipf_ids(n_elements, universe, params.get('exponent', 1.0), seed, chunk_size)
+        make_vocab = partial(uniform_vocab, universe)
+    elif distribution == 'bursty':
+        universe = params.pop('n_unique', 50000)
+        chunks = bursty_ids(n_elements, universe, seed=seed, chunk_size=chunk_size, **params)
+        make_vocab = partial(uniform_vocab, universe)
+    else:
+        raise ValueError(f"Unknown distribution: {distribution} (expected one of {DISTRIBUTIONS})")
+    
+    names = None if output_file.endswith('.npy') else make_vocab()
+    distinct = write_ids(chunks, output_file, n_elements, universe, names)
+    return {'n_elements': n_elements, 'universe': universe, 'distinct': distinct}
+
+
+def generate_synthetic_stream(n_elements=100000, n_unique=30000, output_file="stream.txt", seed=None):
     """
     Generate a synthetic stream of elements with controlled cardinality.
     
@@ -14,22 +313,28 @@ def generate_synthetic_stream(n_elements=100000, n_unique=30000, output_file="st
         n_elements: Total number of elements in stream
         n_unique: Number of unique elements to draw from
         output_file: Path to output file
+        seed: Seed of the NumPy Generator (None draws from the random
+              module as before, so random.seed() still reproduces the stream)
     """
-    data = [f"item_{random.randint(0, n_unique - 1)}" for _ in range(n_elements)]
+    if seed is None:
+        ids = np.fromiter((random.randint(0, n_unique - 1) for _ in range(n_elements)),
+                          dtype=id_dtype(n_unique), count=n_elements)
+    else:
+        ids = np.concatenate([np.empty(0, dtype=id_dtype(n_unique)), *uniform_ids(n_elements, n_unique, seed)])
+    vocab = uniform_vocab(n_unique)
+    data = [vocab[i] for i in ids.tolist()]
     
     # Write to file
-    with open(output_file, "w") as f:
-        for x in data:
-            f.write(x + "\n")
+    distinct = write_ids([ids], output_file, n_elements, n_unique, vocab)
     
     print(f"Generated {n_elements} elements with ~{n_unique} unique items")
-    print(f"Actual unique count: {len(set(data))}")
+    print(f"Actual unique count: {distinct}")
     print(f"Saved to: {output_file}")
     return data
 
 
 def generate_correlated_stream(n_elements=100000, hot_set_size=100, cold_set_size=50000,
-                                hot_ratio=0.8, output_file="stream.txt"):
+                                hot_ratio=0.8, output_file="stream.txt", seed=None):
     """
     STEP 3: Generate correlated stream data.
     
@@ -44,25 +349,23 @@ def generate_correlated_stream(n_elements=100000, hot_set_size=100, cold_set_siz
         cold_set_size: Number of unpopular items
         hot_ratio: Fraction of traffic from hot set (0.8 = 80%)
         output_file: Path to output file
+        seed: Seed of the NumPy Generator (None draws from the random
+              module as before, so random.seed() still reproduces the stream)
     """
-    hot_items = [f"hot_{i}" for i in range(hot_set_size)]
-    cold_items = [f"cold_{i}" for i in range(cold_set_size)]
-    
-    data = []
-    for _ in range(n_elements):
-        if random.random() < hot_ratio:
-            # 80% from hot set
-            data.append(random.choice(hot_items))
-        else:
-            # 20% from cold set (long tail)
-            data.append(random.choice(cold_items))
+    universe = hot_set_size + cold_set_size
+    if seed is None:
+        hot_ids = range(hot_set_size)
+        cold_ids = range(hot_set_size, universe)
+        ids = np.fromiter((random.choice(hot_ids) if random.random() < hot_ratio else random.choice(cold_ids)
+                           for _ in range(n_elements)), dtype=id_dtype(universe), count=n_elements)
+    else:
+        ids = np.concatenate([np.empty(0, dtype=id_dtype(universe)),
+                              *hot_cold_ids(n_elements, hot_set_size, cold_set_size, hot_ratio, seed)])
+    vocab = hot_cold_vocab(hot_set_size, cold_set_size)
+    data = [vocab[i] for i in ids.tolist()]
     
     # Write to file
-    with open(output_file, "w") as f:
-        for x in data:
-            f.write(x + "\n")
-    
-    unique_count = len(set(data))
+    unique_count = write_ids([ids], output_file, n_elements, universe, vocab)
     print(f"Generated {n_elements} elements (correlated)")
     print(f"Hot set size: {hot_set_size} items (80% of traffic)")
     print(f"Cold set size: {cold_set_size} items (20% of traffic)")
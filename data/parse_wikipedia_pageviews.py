@@ -46,6 +46,49 @@ def parse_pageviews_file(filepath: str, max_items: int = None) -> List[str]:
     
     return pages
 
+def parse_pageview_runs(filepath: str, max_items: int = None) -> Tuple[List[str], List[int]]:
+    """
+    Parse Wikipedia pageviews file as a run-length encoded stream.
+
+    Each line becomes one run: the page title repeated count_views times.
+    Feed the result to a sketch's add_runs() or to run_runs_with_trace()
+    instead of expanding the views into individual items.
+
+    Returns:
+        Tuple of (pages, counts); max_items limits the number of runs
+    """
+    pages = []
+    counts = []
+
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+
+                parts = line.split()
+                if len(parts) >= 3:
+                    page = parts[1]
+                    # Skip special pages
+                    if page.startswith(('Special:', 'MediaWiki:', 'Template:', 'File:')):
+                        continue
+                    try:
+                        views = int(parts[2])
+                    except ValueError:
+                        continue
+                    if views > 0:
+                        pages.append(page)
+                        counts.append(views)
+
+                        if max_items and len(pages) >= max_items:
+                            break
+
+    except Exception as e:
+        print(f"Error parsing file: {e}")
+
+    return pages, counts
+
 def analyze_stream(pages: List[str]) -> dict:
     """Analyze stream characteristics."""
     unique_pages = set(pages)
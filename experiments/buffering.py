@@ -5,39 +5,84 @@ Proposes a lightweight buffering mechanism to mitigate order sensitivity.
 Idea: Buffer items and shuffle before adding to sketch to decorrelate temporal patterns.
 """
 
-import random
 import sys
 import os
+import operator
+from collections import Counter
+from functools import partial
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from sketches.hll import HyperLogLog
 from sketches.fm import FlajoletMartin
+from sketches.kmv import KMVSketch
+from sketches.linear_counting import LinearCounting
+from experiments.orderings import encode_ids, hot_first_order, apply_order
+from experiments.sweep import run_sweep
+
 
+# Sketches whose batch update is cheaper than collapsing a window with a
+# Counter; repeats never change them, so their windows are applied as is
+UNCOLLAPSED_SKETCHES = (LinearCounting, KMVSketch)
 
-class BufferedHLL:
+
+class BufferedSketch:
     """
-    HyperLogLog with order-robust buffering.
+    Order-robust buffering around any sketch.
     
-    Maintains a small buffer of items. When buffer reaches threshold,
-    items are randomly shuffled before being added to the underlying HLL.
-    This decorrelates temporal patterns in the input stream.
+    Items are collected in a buffer. When the buffer is full, repeats in
+    the window are collapsed (keeping their multiplicities), each distinct
+    item is hashed once, and the hashes are permuted with a NumPy RNG and
+    applied through the sketch's vectorized add_hashes() path. On bursty
+    streams most of a window is repeats, so a flush does a fraction of the
+    hashing and update work of a per-item add() loop. Sketches in
+    UNCOLLAPSED_SKETCHES skip the collapse: their windows are hashed and
+    shuffled whole.
+    
+    Works with HyperLogLog, FlajoletMartin, KMVSketch, ThetaSketch and
+    LinearCounting (anything providing hash_items/add_hashes).
+    
+    With background=True the sketch is double-buffered: producers keep
+    filling one buffer while a worker thread applies the other, so add()
+    never waits for a flush unless the worker is still busy with the
+    previous window. Only the worker touches the sketch; count() drains
+    in-flight work before estimating.
     """
     
-    def __init__(self, p=10, buffer_size=500):
+    def __init__(self, sketch, buffer_size=500, seed=None, background=False, collapse=None):
         """
-        Initialize buffered HLL.
+        Initialize buffered sketch.
         
         Args:
-            p: HLL precision parameter
-            buffer_size: Size of the buffer (typically 1-5% of HLL memory)
+            sketch: Sketch instance to feed
+            buffer_size: Size of the buffer (typically 1-5% of sketch memory)
+            seed: Seed for the shuffle RNG (None = nondeterministic)
+            background: Apply full buffers on a worker thread (double buffering)
+            collapse: Collapse repeats in each window before hashing
+                      (None: unless the sketch is in UNCOLLAPSED_SKETCHES)
         """
-        self.hll = HyperLogLog(p=p)
+        self.sketch = sketch
+        self.collapse = not isinstance(sketch, UNCOLLAPSED_SKETCHES) if collapse is None else collapse
         self.buffer = []
         self.buffer_size = buffer_size
-        self.p = p
         self.flushes = 0
+        self.items_flushed = 0
+        self.distinct_flushed = 0
+        self._rng = np.random.default_rng(seed)
+        
+        self.background = background
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+        self._spare = []  # Second buffer, owned by the worker while a flush is in flight
+        self._in_flight = None
+        
+        # Extra occurrences of runs added with add_run(), per buffer
+        self._run_extra = Counter()
+        self._spare_run_extra = Counter()
     
     def add(self, item):
         """Add item to buffer. Flush when buffer is full."""
@@ -45,75 +90,322 @@ class BufferedHLL:
         if len(self.buffer) >= self.buffer_size:
             self.flush()
     
+    def add_many(self, items):
+        """Add a batch of items, flushing each time the buffer fills."""
+        it = iter(items)
+        while True:
+            # Fill the buffer a slice at a time rather than one add() per item
+            self.buffer.extend(islice(it, max(self.buffer_size - len(self.buffer), 0)))
+            if len(self.buffer) < self.buffer_size:
+                return
+            self.flush()
+    
+    def add_run(self, item, count=1):
+        """Add a run of `count` identical items; it takes one buffer slot."""
+        if count <= 0:
+            return
+        if count > 1:
+            self._run_extra[item] += count - 1
+        self.add(item)
+    
+    def add_runs(self, items, counts):
+        """Add a batch of runs (run-length encoded stream)."""
+        for item, count in zip(items, counts):
+            self.add_run(item, int(count))
+    
     def flush(self):
-        """Shuffle buffer contents and add to underlying HLL."""
-        random.shuffle(self.buffer)
-        for item in self.buffer:
-            self.hll.add(item)
-        self.buffer.clear()
+        """Collapse, hash and shuffle buffer contents and add them to the underlying sketch."""
+        if self._executor is None:
+            self._apply(self.buffer, self._run_extra)
+            return
+        
+        # Swap buffers: the full one goes to the worker, producers continue
+        # on the spare once the worker has released it
+        self.wait()
+        window, self.buffer, self._spare = self.buffer, self._spare, self.buffer
+        extra, self._run_extra, self._spare_run_extra = (
+            self._run_extra, self._spare_run_extra, self._run_extra)
+        self._in_flight = self._executor.submit(self._apply, window, extra)
+    
+    def _apply(self, window_items, run_extra):
+        """Apply one buffer window (plus extra run occurrences) to the sketch and empty it."""
+        items_in_window = len(window_items) + sum(run_extra.values())
+        if self.collapse:
+            window = Counter(window_items)
+            window.update(run_extra)
+            items = list(window)
+            counts = np.fromiter(window.values(), dtype=np.int64, count=len(window))
+            self.distinct_flushed += len(window)
+        elif run_extra:
+            # Each run is already in the window once; add its extra occurrences
+            items = window_items + list(run_extra)
+            counts = np.ones(len(items), dtype=np.int64)
+            counts[len(window_items):] = list(run_extra.values())
+        else:
+            items = window_items
+            counts = None
+        run_extra.clear()
+        hashes = self.sketch.hash_items(items)
+        
+        # Shuffle hashes and multiplicities together
+        perm = self._rng.permutation(len(items))
+        self.sketch.add_hashes(hashes[perm], None if counts is None else counts[perm])
+        
+        self.items_flushed += items_in_window
+        window_items.clear()
         self.flushes += 1
     
+    def wait(self):
+        """Block until the in-flight background flush (if any) has been applied."""
+        if self._in_flight is not None:
+            in_flight, self._in_flight = self._in_flight, None
+            in_flight.result()  # Re-raises worker exceptions here
+    
     def count(self):
         """Get cardinality estimate (flushes remaining buffer)."""
         if self.buffer:
             self.flush()
-        return self.hll.count()
+        self.wait()
+        return self.sketch.count()
+    
+    def close(self):
+        """Drain pending work and stop the background worker."""
+        if self.buffer:
+            self.flush()
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
     def get_stats(self):
         """Return buffering statistics."""
         return {
             'buffer_size': self.buffer_size,
             'flushes': self.flushes,
-            'current_buffer_items': len(self.buffer)
+            'current_buffer_items': len(self.buffer),
+            'items_flushed': self.items_flushed,
+            'distinct_flushed': self.distinct_flushed,
+            'collapse_ratio': (self.items_flushed / self.distinct_flushed
+                               if self.distinct_flushed else 1.0)
         }
 
 
-class BufferedFM:
+class BufferedHLL(BufferedSketch):
+    """
+    HyperLogLog with order-robust buffering.
+    
+    Maintains a small buffer of items. When buffer reaches threshold,
+    items are randomly shuffled before being added to the underlying HLL.
+    This decorrelates temporal patterns in the input stream.
+    """
+    
+    def __init__(self, p=10, buffer_size=500, seed=None, background=False):
+        """
+        Initialize buffered HLL.
+        
+        Args:
+            p: HLL precision parameter
+            buffer_size: Size of the buffer (typically 1-5% of HLL memory)
+            seed: Seed for the shuffle RNG
+            background: Flush on a worker thread (double buffering)
+        """
+        super().__init__(HyperLogLog(p=p), buffer_size, seed, background)
+        self.hll = self.sketch
+        self.p = p
+
+
+class BufferedFM(BufferedSketch):
     """
     Flajolet-Martin with order-robust buffering.
     """
     
-    def __init__(self, num_hashes=64, buffer_size=500):
+    def __init__(self, num_hashes=64, buffer_size=500, seed=None, background=False):
         """
         Initialize buffered FM.
         
         Args:
             num_hashes: Number of hash functions
             buffer_size: Size of the buffer
+            seed: Seed for the shuffle RNG
+            background: Flush on a worker thread (double buffering)
         """
-        self.fm = FlajoletMartin(num_hashes=num_hashes)
-        self.buffer = []
-        self.buffer_size = buffer_size
+        super().__init__(FlajoletMartin(num_hashes=num_hashes), buffer_size, seed, background)
+        self.fm = self.sketch
         self.num_hashes = num_hashes
-        self.flushes = 0
+
+
+class AdaptiveBufferedSketch(BufferedSketch):
+    """
+    Buffered sketch that sizes its buffer from online burst statistics.
     
-    def add(self, item):
-        """Add item to buffer. Flush when buffer is full."""
-        self.buffer.append(item)
-        if len(self.buffer) >= self.buffer_size:
-            self.flush()
+    Each flush measures the window's repeat rate (1 - distinct/items, as
+    in the collapse step) and mean run length of identical consecutive
+    items (the burst statistic of parse_enron_emails.analyze_statistics),
+    smoothed with an exponential moving average:
+    
+    - Bursty windows (high repeat rate) double the buffer, up to max_size,
+      since larger windows collapse more repeats per flush.
+    - Windows with few repeats halve it, down to min_size.
+    - Windows that already look random (almost no repeats, runs of ~1)
+      switch to bypass mode: items go straight to the batch path with no
+      collapsing or shuffling, at the current batch size. Every
+      probe_every-th flush is still collapsed to re-measure the repeat
+      rate, so bursts end bypass.
+    
+    Windows are always collapsed (outside bypass mode), whatever the
+    sketch, since the repeat rate is measured there.
+    
+    Estimates are identical to an unbuffered sketch at every count() call;
+    max_size bounds how far the sketch can lag the producer between calls.
+    
+    Statistics are measured where a window is applied (the worker thread
+    in background mode), but buffer_size and bypass only change in flush()
+    on the producer side, after the previous window has been applied, so
+    the worker never races the producer on them. In background mode a
+    window's statistics therefore take effect one flush later.
+    """
+    
+    def __init__(self, sketch, initial_size=500, min_size=100, max_size=4000,
+                 seed=None, background=False, grow_above=0.5, shrink_below=0.1,
+                 bypass_below=0.02, smoothing=0.3, probe_every=8):
+        """
+        Initialize adaptive buffered sketch.
+        
+        Args:
+            sketch: Sketch instance to feed
+            initial_size: Starting buffer size
+            min_size: Smallest buffer size
+            max_size: Largest buffer size
+            seed: Seed for the shuffle RNG
+            background: Flush on a worker thread (double buffering)
+            grow_above: Smoothed repeat rate above which the buffer doubles
+            shrink_below: Smoothed repeat rate below which the buffer halves
+            bypass_below: Smoothed repeat rate below which buffering is bypassed
+            smoothing: EWMA weight of the newest window
+            probe_every: In bypass mode, collapse every N-th flush to re-measure
+        """
+        super().__init__(sketch, initial_size, seed, background, collapse=True)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.grow_above = grow_above
+        self.shrink_below = shrink_below
+        self.bypass_below = bypass_below
+        self.smoothing = smoothing
+        self.probe_every = probe_every
+        
+        self.repeat_rate = None
+        self.mean_run_length = None
+        self.bypass = False
+        self.resizes = 0
+        self.items_bypassed = 0  # Applied without collapsing (not counted as distinct)
+        self._measured = False  # A window was measured since the last _adapt()
+    
+    def _smooth(self, previous, value):
+        if previous is None:
+            return value
+        return (1 - self.smoothing) * previous + self.smoothing * value
+    
+    def _apply(self, window_items, run_extra):
+        """Apply one window, update burst statistics and adapt the buffer."""
+        n = len(window_items) + sum(run_extra.values())
+        if n == 0:
+            return
+        
+        # Run count = 1 + number of positions where the item changes
+        runs = 1 + sum(map(operator.ne, window_items[1:], window_items[:-1]))
+        self.mean_run_length = self._smooth(self.mean_run_length, n / runs)
+        
+        if self.bypass and not run_extra and self.flushes % self.probe_every:
+            self.sketch.add_hashes(self.sketch.hash_items(window_items))
+            self.items_flushed += n
+            self.items_bypassed += n
+            window_items.clear()
+            self.flushes += 1
+        else:
+            distinct_before = self.distinct_flushed
+            super()._apply(window_items, run_extra)
+            distinct = self.distinct_flushed - distinct_before
+            self.repeat_rate = self._smooth(self.repeat_rate, 1 - distinct / n)
+        self._measured = True
     
     def flush(self):
-        """Shuffle buffer contents and add to underlying FM."""
-        random.shuffle(self.buffer)
-        for item in self.buffer:
-            self.fm.add(item)
-        self.buffer.clear()
-        self.flushes += 1
+        """Adapt to the last applied window, then flush as BufferedSketch does."""
+        self.wait()
+        self._adapt()
+        super().flush()
+        if self._executor is None:
+            self._adapt()
     
-    def count(self):
-        """Get cardinality estimate (flushes remaining buffer)."""
-        if self.buffer:
-            self.flush()
-        return self.fm.count()
+    def _adapt(self):
+        """Resize the buffer or toggle bypass from the smoothed statistics."""
+        if not self._measured or self.repeat_rate is None:
+            return
+        self._measured = False
+        
+        self.bypass = (self.repeat_rate < self.bypass_below
+                       and self.mean_run_length < 1 + self.bypass_below)
+        if self.bypass:
+            # Nothing to collapse; keep the batch size that amortizes hashing
+            return
+        
+        size = self.buffer_size
+        if self.repeat_rate > self.grow_above:
+            size = min(size * 2, self.max_size)
+        elif self.repeat_rate < self.shrink_below:
+            size = max(size // 2, self.min_size)
+        
+        if size != self.buffer_size:
+            self.buffer_size = size
+            self.resizes += 1
     
     def get_stats(self):
-        """Return buffering statistics."""
-        return {
-            'buffer_size': self.buffer_size,
-            'flushes': self.flushes,
-            'current_buffer_items': len(self.buffer)
-        }
+        """Return buffering statistics, including the adaptive state."""
+        stats = super().get_stats()
+        collapsed = self.items_flushed - self.items_bypassed
+        stats.update({
+            'collapse_ratio': collapsed / self.distinct_flushed if self.distinct_flushed else 1.0,
+            'items_bypassed': self.items_bypassed,
+            'repeat_rate': self.repeat_rate,
+            'mean_run_length': self.mean_run_length,
+            'bypass': self.bypass,
+            'resizes': self.resizes
+        })
+        return stats
+
+
+def replay_buffered(sketch, ids, vocab_hashes, buffer_size=500, seed=None):
+    """
+    Feed an encoded stream to a sketch the way BufferedSketch does.
+    
+    Every window of buffer_size items is collapsed to its distinct items
+    with their multiplicities, shuffled and applied with add_hashes(), as
+    in BufferedSketch.flush(). Hashes are looked up in vocab_hashes
+    instead of being recomputed, so buffered variants of one sketch type
+    can all replay a stream that was hashed once.
+    
+    Args:
+        sketch: Sketch instance to feed
+        ids: Integer item IDs in stream order (see encode_ids)
+        vocab_hashes: sketch.hash_items(vocab), indexed by ID
+        buffer_size: Items per window
+        seed: Seed for the shuffle RNG (None = nondeterministic)
+    
+    Returns:
+        The sketch
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.asarray(ids)
+    for start in range(0, len(ids), buffer_size):
+        window, counts = np.unique(ids[start:start + buffer_size], return_counts=True)
+        perm = rng.permutation(len(window))
+        sketch.add_hashes(vocab_hashes[window[perm]], counts[perm])
+    return sketch
 
 
 def load_stream(filepath):
@@ -132,15 +424,11 @@ def compare_buffering_strategies(stream_path, num_runs=5):
     stream = load_stream(stream_path)
     true_count = len(set(stream))
     
-    # Create grouped (bursty) order
-    grouped = []
-    unique_items = list(set(stream))[:50]  # Group first 50 unique items heavily
-    for item in unique_items:
-        grouped.extend([item] * (stream.count(item)))
-    for item in stream:
-        if item not in grouped:
-            grouped.append(item)
-    grouped = grouped[:len(stream)]
+    # Create grouped (bursty) order: the 50 hottest items as contiguous
+    # runs up front, the rest in stream order
+    ids, vocab = encode_ids(stream)
+    order = hot_first_order(ids, num_hot=50)
+    grouped = apply_order(stream, order)
     
     print(f"{'='*70}")
     print(f"EXPERIMENT: Order-Robust Buffering Strategy")
@@ -150,47 +438,56 @@ def compare_buffering_strategies(stream_path, num_runs=5):
     print(f"Testing on GROUPED (worst-case) order to isolate buffering effect")
     print(f"Number of runs: {num_runs}\n")
     
-    # Test different buffer sizes
+    # Test different buffer sizes. Standard sketches do not depend on the
+    # buffer size (or the run), so the sweep computes them once; every
+    # arm reads the vocabulary hashed once per sketch type.
     buffer_sizes = [100, 500, 1000, 2000]
     results = {}
     
-    for buf_size in buffer_sizes:
+    grouped_ids = ids[order]
+    
+    def relative_error(sketch):
+        return abs(sketch.count() - true_count) / true_count
+    
+    def vocab_hashes(make):
+        def stage(params, context):
+            return make().hash_items(vocab.tolist())
+        return stage
+    
+    def standard(make, hashes):
+        def stage(params, context):
+            sketch = make()
+            sketch.add_hashes(context[hashes][grouped_ids])
+            return relative_error(sketch)
+        return stage
+    
+    def buffered(make, hashes):
+        def stage(params, context):
+            sketch = replay_buffered(make(), grouped_ids, context[hashes], params['buffer_size'])
+            return relative_error(sketch)
+        return stage
+    
+    make_hll = partial(HyperLogLog, p=10)
+    make_fm = partial(FlajoletMartin, num_hashes=64)
+    stages = {
+        'hll_hashes': (vocab_hashes(make_hll), ()),
+        'fm_hashes': (vocab_hashes(make_fm), ()),
+        'hll': (standard(make_hll, 'hll_hashes'), ()),
+        'buffered_hll': (buffered(make_hll, 'hll_hashes'), ('buffer_size', 'run')),
+        'fm': (standard(make_fm, 'fm_hashes'), ()),
+        'buffered_fm': (buffered(make_fm, 'fm_hashes'), ('buffer_size', 'run')),
+    }
+    sweep = run_sweep({'buffer_size': buffer_sizes}, stages, runs=num_runs)
+    
+    for params, contexts in sweep:
+        buf_size = params['buffer_size']
         print(f"Buffer size: {buf_size} items")
         print("-" * 50)
         
-        hll_errors = []
-        buffered_hll_errors = []
-        fm_errors = []
-        buffered_fm_errors = []
-        
-        for run in range(num_runs):
-            # Standard HLL
-            hll = HyperLogLog(p=10)
-            for item in grouped:
-                hll.add(item)
-            hll_est = hll.count()
-            hll_errors.append(abs(hll_est - true_count) / true_count)
-            
-            # Buffered HLL
-            buf_hll = BufferedHLL(p=10, buffer_size=buf_size)
-            for item in grouped:
-                buf_hll.add(item)
-            buf_hll_est = buf_hll.count()
-            buffered_hll_errors.append(abs(buf_hll_est - true_count) / true_count)
-            
-            # Standard FM
-            fm = FlajoletMartin(num_hashes=64)
-            for item in grouped:
-                fm.add(item)
-            fm_est = fm.count()
-            fm_errors.append(abs(fm_est - true_count) / true_count)
-            
-            # Buffered FM
-            buf_fm = BufferedFM(num_hashes=64, buffer_size=buf_size)
-            for item in grouped:
-                buf_fm.add(item)
-            buf_fm_est = buf_fm.count()
-            buffered_fm_errors.append(abs(buf_fm_est - true_count) / true_count)
+        hll_errors = [context['hll'] for context in contexts]
+        buffered_hll_errors = [context['buffered_hll'] for context in contexts]
+        fm_errors = [context['fm'] for context in contexts]
+        buffered_fm_errors = [context['buffered_fm'] for context in contexts]
         
         # Statistics
         hll_mean_error = sum(hll_errors) / len(hll_errors)
@@ -223,6 +520,23 @@ def compare_buffering_strategies(stream_path, num_runs=5):
         print(f"  Buffered:     {buf_fm_mean_error*100:.2f}% ± {buf_fm_std*100:.2f}%")
         print(f"  Improvement:  {improvement_fm:.1f}%\n")
     
+    # Adaptive buffer sizing instead of a fixed size
+    print("Adaptive buffer (100-4000 items)")
+    print("-" * 50)
+    adaptive_hll = AdaptiveBufferedSketch(HyperLogLog(p=10), min_size=100, max_size=4000)
+    for item in grouped:
+        adaptive_hll.add(item)
+    adaptive_error = abs(adaptive_hll.count() - true_count) / true_count
+    adaptive_stats = adaptive_hll.get_stats()
+    results['adaptive'] = {
+        'hll': {'mean_error': adaptive_error},
+        'stats': adaptive_stats
+    }
+    print(f"HyperLogLog:")
+    print(f"  Error:        {adaptive_error*100:.2f}%")
+    print(f"  Final buffer: {adaptive_stats['buffer_size']} items (bypass={adaptive_stats['bypass']})")
+    print(f"  Repeat rate:  {adaptive_stats['repeat_rate']*100:.1f}%\n")
+    
     return results
 
 
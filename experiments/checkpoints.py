@@ -0,0 +1,288 @@
+"""
+Checkpoint Schedules
+
+Trace loops used to test `i % step == 0` after every item. Here the
+checkpoint positions are computed up front, the stream between two
+checkpoints is ingested as one batch (sketch.add_many / add_runs), and
+the estimator is called only at the checkpoints, writing into a
+preallocated array. Batches are cut exactly at checkpoint boundaries,
+so positions are identical to the per-item loop.
+
+Positions are 1-based item counts: position p means "after p items".
+"""
+
+from itertools import islice
+
+import numpy as np
+
+
+BATCH_SIZE = 65536  # Max items handed to add_many() per call
+DEFAULT_BUDGET = 200  # Checkpoints per trace for log/hybrid schedules
+SCHEDULES = ('linear', 'log', 'hybrid')
+
+
+def linear_schedule(n, step, include_end=True):
+    """
+    Checkpoints every `step` items.
+
+    Args:
+        n: Stream length
+        step: Items between checkpoints
+        include_end: Also checkpoint at n if it is not a multiple of step
+
+    Returns:
+        Sorted int64 array of positions in [1, n]
+    """
+    if step <= 0:
+        raise ValueError("step must be positive")
+    positions = np.arange(step, n + 1, step, dtype=np.int64)
+    if include_end and n > 0 and (positions.size == 0 or positions[-1] != n):
+        positions = np.append(positions, np.int64(n))
+    return positions
+
+
+def log_schedule(n, num_checkpoints, first=1):
+    """
+    Geometrically spaced checkpoints from `first` to n.
+
+    Small positions collapse onto the same integer, so fewer than
+    num_checkpoints positions may be returned.
+
+    Args:
+        n: Stream length
+        num_checkpoints: Number of positions requested
+        first: First position
+
+    Returns:
+        Sorted, unique int64 array of positions in [first, n], ending at n
+    """
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    first = min(max(1, first), n)
+    positions = np.geomspace(first, n, num=max(1, num_checkpoints))
+    positions = np.unique(np.round(positions).astype(np.int64))
+    positions[-1] = n
+    return positions
+
+
+def hybrid_schedule(n, budget=DEFAULT_BUDGET, log_fraction=0.5):
+    """
+    Log-spaced checkpoints early in the stream, linear ones later.
+
+    The linear part uses step = ceil(n / linear_budget); the log part
+    covers [1, step) so the two join without a gap.
+
+    Args:
+        n: Stream length
+        budget: Total number of checkpoints (upper bound)
+        log_fraction: Share of the budget spent on the log-spaced part
+
+    Returns:
+        Sorted, unique int64 array of positions in [1, n], ending at n
+    """
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    num_log = int(round(budget * log_fraction))
+    num_linear = max(1, budget - num_log)
+    step = -(-n // num_linear)
+
+    linear = linear_schedule(n, step)
+    if num_log == 0 or step <= 1:
+        return linear
+    return np.union1d(log_schedule(step - 1, num_log), linear)
+
+
+def make_schedule(n, schedule='linear', budget=None, step=None):
+    """
+    Build checkpoint positions by name.
+
+    Args:
+        n: Stream length
+        schedule: 'linear', 'log' or 'hybrid'
+        budget: Number of checkpoints (default DEFAULT_BUDGET; for 'linear'
+                it sets step = n // budget when step is not given)
+        step: Items between linear checkpoints
+
+    Returns:
+        Sorted int64 array of positions in [1, n], ending at n
+    """
+    if schedule == 'linear':
+        if step is None:
+            step = max(1, n // (budget or DEFAULT_BUDGET))
+        return linear_schedule(n, step)
+    if budget is None:
+        budget = DEFAULT_BUDGET
+    if schedule == 'log':
+        return log_schedule(n, budget)
+    if schedule == 'hybrid':
+        return hybrid_schedule(n, budget)
+    raise ValueError(f"Unknown schedule: {schedule} (expected one of {SCHEDULES})")
+
+
+def explicit_schedule(n, positions):
+    """
+    Checkpoints at the given positions.
+
+    Args:
+        n: Stream length
+        positions: Iterable of positions; values outside [1, n] are dropped
+
+    Returns:
+        Sorted, unique int64 array of positions
+    """
+    positions = np.unique(np.asarray(list(positions), dtype=np.int64))
+    return positions[(positions >= 1) & (positions <= n)]
+
+
+def _record(estimates, j, num_positions, value):
+    """Store checkpoint j, allocating the result array from the first value's shape."""
+    if estimates is None:
+        estimates = np.empty((num_positions,) + np.shape(value), dtype=np.float64)
+    estimates[j] = value
+    return estimates
+
+
+def run_schedule(sketch, items, positions, estimator=None, on_checkpoint=None,
+                 batch_size=BATCH_SIZE):
+    """
+    Ingest a stream and estimate only at the scheduled positions.
+
+    Args:
+        sketch: Sketch with add() and count(); add_many() is used when present
+        items: Iterable of items (list, generator, StreamStore.iter_range(), ...)
+        positions: Non-decreasing positions (see the *_schedule builders)
+        estimator: Callable(sketch) -> estimate (default: sketch.count())
+        on_checkpoint: Optional sink called as on_checkpoint(position, estimate)
+        batch_size: Max items per add_many() call
+
+    Returns:
+        float64 array of estimates, one row per position (shaped
+        (positions, R) when the estimator returns R values, e.g. MultiRunHLL)
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if estimator is None:
+        estimator = type(sketch).count
+    add_many = getattr(sketch, 'add_many', None)
+
+    estimates = None
+    it = iter(items)
+    seen = 0
+    for j, position in enumerate(positions.tolist()):
+        while seen < position:
+            batch = list(islice(it, min(batch_size, position - seen)))
+            if not batch:
+                raise ValueError(f"stream ended at {seen} items, before checkpoint {position}")
+            if add_many is not None:
+                add_many(batch)
+            else:
+                for item in batch:
+                    sketch.add(item)
+            seen += len(batch)
+
+        estimates = _record(estimates, j, len(positions), estimator(sketch))
+        if on_checkpoint is not None:
+            on_checkpoint(position, estimates[j])
+
+    return estimates if estimates is not None else np.empty(0, dtype=np.float64)
+
+
+def run_hashed_schedule(sketch, hashes, positions, estimator=None, on_checkpoint=None,
+                        batch_size=BATCH_SIZE, vocab_hashes=None):
+    """
+    run_schedule() for a stream that was hashed up front.
+
+    Segments between two checkpoints go to sketch.add_hashes() in batches,
+    so a stream hashed once can be replayed into several sketches of the
+    same hash family without hashing it again. With vocab_hashes, the
+    stream is given as item IDs instead (any sliceable array, such as a
+    memory-mapped .npy of generated IDs) and hashes are looked up one
+    batch at a time, so the per-item hash array is never materialized.
+
+    Args:
+        sketch: Sketch with add_hashes() and count()
+        hashes: Per-item hashes from sketch.hash_items() in stream order,
+                or item IDs when vocab_hashes is given
+        positions: Non-decreasing positions (see the *_schedule builders)
+        estimator: Callable(sketch) -> estimate (default: sketch.count())
+        on_checkpoint: Optional sink called as on_checkpoint(position, estimate)
+        batch_size: Max items per add_hashes() call
+        vocab_hashes: Optional sketch.hash_items(vocab), indexed by ID
+
+    Returns:
+        float64 array of estimates, one row per position
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if estimator is None:
+        estimator = type(sketch).count
+    if len(positions) and positions[-1] > len(hashes):
+        raise ValueError(f"stream ended at {len(hashes)} items, before checkpoint {int(positions[-1])}")
+
+    estimates = None
+    seen = 0
+    for j, position in enumerate(positions.tolist()):
+        while seen < position:
+            stop = min(seen + batch_size, position)
+            batch = hashes[seen:stop]
+            if vocab_hashes is not None:
+                batch = vocab_hashes[np.asarray(batch)]
+            sketch.add_hashes(batch)
+            seen = stop
+
+        estimates = _record(estimates, j, len(positions), estimator(sketch))
+        if on_checkpoint is not None:
+            on_checkpoint(position, estimates[j])
+
+    return estimates if estimates is not None else np.empty(0, dtype=np.float64)
+
+
+def run_runs_schedule(sketch, items, counts, positions, estimator=None, on_checkpoint=None):
+    """
+    run_schedule() for a run-length encoded stream.
+
+    items[j] repeated counts[j] times is the stream. Runs that straddle a
+    checkpoint are split there and fed with sketch.add_runs().
+
+    Args:
+        sketch: Sketch with add_runs() and count()
+        items: Run items (random access)
+        counts: Run lengths; non-positive runs are skipped
+        positions: Non-decreasing positions in expanded-stream items
+        estimator: Callable(sketch) -> estimate (default: sketch.count())
+        on_checkpoint: Optional sink called as on_checkpoint(position, estimate)
+
+    Returns:
+        float64 array of estimates, one row per position
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if estimator is None:
+        estimator = type(sketch).count
+
+    counts = np.asarray(counts, dtype=np.int64)
+    keep = counts > 0
+    if not keep.all():
+        items = [item for item, k in zip(items, keep.tolist()) if k]
+        counts = counts[keep]
+
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    if len(positions) and positions[-1] > total:
+        raise ValueError(f"stream ended at {total} items, before checkpoint {int(positions[-1])}")
+
+    # Cut the runs into segments at every run end and every checkpoint
+    bounds = np.union1d(ends, positions)
+    seg_counts = np.diff(bounds, prepend=0)
+    seg_run = np.searchsorted(ends, bounds, side='left')
+    cut = np.searchsorted(bounds, positions, side='right')
+
+    estimates = None
+    done = 0
+    for j, (position, upto) in enumerate(zip(positions.tolist(), cut.tolist())):
+        if upto > done:
+            sketch.add_runs([items[r] for r in seg_run[done:upto].tolist()], seg_counts[done:upto])
+            done = upto
+
+        estimates = _record(estimates, j, len(positions), estimator(sketch))
+        if on_checkpoint is not None:
+            on_checkpoint(position, estimates[j])
+
+    return estimates if estimates is not None else np.empty(0, dtype=np.float64)
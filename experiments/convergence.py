@@ -10,15 +10,29 @@ Intermediate estimates are NOT, and that's where order sensitivity matters.
 
 import sys
 import os
-import random
 import json
 
+import numpy as np
+
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from sketches.hll import HyperLogLog
+from sketches.hll import HyperLogLog, fold_registers
 from sketches.fm import FlajoletMartin
 from sketches.linear_counting import LinearCounting
-from experiments.buffering import BufferedHLL, BufferedFM
+from sketches.kmv import KMVSketch
+from sketches.theta_sketch import ThetaSketch
+from sketches.front_cache import FrontCache
+from sketches.multi_hll import MultiRunHLL, estimate_registers
+from sketches.sliding_hll import SlidingHyperLogLog
+from experiments.buffering import BufferedSketch, BufferedHLL, BufferedFM
+from experiments.permutation import FeistelPermutation
+from experiments.orderings import encode_ids, apply_order, chunk_shuffled_order, grouped_order
+from experiments.checkpoints import (
+    linear_schedule, make_schedule, run_schedule, run_runs_schedule, run_hashed_schedule
+)
+from experiments.convergence_metrics import (
+    DEFAULT_THRESHOLDS, DEFAULT_FRACTIONS, traces_to_arrays, convergence_metrics
+)
 
 
 def load_stream(filepath):
@@ -27,18 +41,21 @@ def load_stream(filepath):
         return [line.strip() for line in f if line.strip()]
 
 
-def run_with_trace(stream, sketch_type='hll', sketch_params=None, step=1000):
+def make_sketch(sketch_type='hll', sketch_params=None):
     """
-    Run sketch and record estimates at regular intervals.
+    Build a sketch for a trace run.
     
     Args:
-        stream: List of items
-        sketch_type: 'hll', 'fm', 'buffered_hll', 'buffered_fm'
-        sketch_params: Dict of parameters
-        step: Record estimate every N items
+        sketch_type: 'hll', 'fm', 'linear_counting', 'kmv', 'theta',
+                     'buffered_hll', 'buffered_fm', 'multi_hll',
+                     'buffered_multi_hll', 'sliding_hll'
+        sketch_params: Dict of parameters; 'front_cache': N puts an N-slot
+                       duplicate-suppression cache in front of the sketch;
+                       'runs' and 'seed' configure the multi-run types;
+                       'window' is the sliding_hll window in items
     
     Returns:
-        List of (position, estimate) tuples
+        Sketch instance with add/add_runs/count
     """
     if sketch_params is None:
         sketch_params = {}
@@ -50,6 +67,25 @@ def run_with_trace(stream, sketch_type='hll', sketch_params=None, step=1000):
         sketch = FlajoletMartin(num_hashes=sketch_params.get('num_hashes', 64))
     elif sketch_type == 'linear_counting':
         sketch = LinearCounting(m=sketch_params.get('m', 16384))
+    elif sketch_type == 'kmv':
+        sketch = KMVSketch(k=sketch_params.get('k', 512))
+    elif sketch_type == 'theta':
+        sketch = ThetaSketch(k=sketch_params.get('k', 4096))
+    elif sketch_type == 'multi_hll':
+        sketch = MultiRunHLL(
+            p=sketch_params.get('p', 10),
+            runs=sketch_params.get('runs', 8),
+            seed=sketch_params.get('seed', 0)
+        )
+    elif sketch_type == 'sliding_hll':
+        # Dropping or collapsing repeats would stop refreshing an item's
+        # last-seen position, and the window is counted in items
+        if sketch_params.get('front_cache') or 'buffer_size' in sketch_params:
+            raise ValueError("sliding_hll cannot be combined with front_cache or buffering")
+        sketch = SlidingHyperLogLog(
+            p=sketch_params.get('p', 10),
+            window=sketch_params.get('window')
+        )
     elif sketch_type == 'buffered_hll':
         sketch = BufferedHLL(
             p=sketch_params.get('p', 10),
@@ -60,31 +96,231 @@ def run_with_trace(stream, sketch_type='hll', sketch_params=None, step=1000):
             num_hashes=sketch_params.get('num_hashes', 64),
             buffer_size=sketch_params.get('buffer_size', 500)
         )
+    elif sketch_type == 'buffered_multi_hll':
+        sketch = BufferedSketch(
+            MultiRunHLL(
+                p=sketch_params.get('p', 10),
+                runs=sketch_params.get('runs', 8),
+                seed=sketch_params.get('seed', 0)
+            ),
+            buffer_size=sketch_params.get('buffer_size', 500)
+        )
     else:
         raise ValueError(f"Unknown sketch type: {sketch_type}")
     
-    estimates = []
+    if sketch_params.get('front_cache'):
+        sketch = FrontCache(sketch, size=sketch_params['front_cache'])
+    
+    return sketch
+
+
+def trace_positions(n, step=1000, schedule='linear', budget=None):
+    """
+    Checkpoint positions for a trace over n items.
+    
+    The default (linear, no budget) checkpoints every step items and then
+    once more at n, as traces always have. 'log' and 'hybrid' (see
+    experiments.checkpoints) keep the number of checkpoints at the budget
+    however long the stream is, while resolving the early stream finely.
+    """
+    if schedule == 'linear' and budget is None:
+        return np.append(linear_schedule(n, step, include_end=False), n)
+    return make_schedule(n, schedule, budget)
+
+
+def run_with_trace(stream, sketch_type='hll', sketch_params=None, step=1000,
+                   schedule='linear', budget=None):
+    """
+    Run sketch and record estimates at regular intervals.
+    
+    Args:
+        stream: List of items
+        sketch_type: Any type accepted by make_sketch()
+        sketch_params: Dict of parameters (see make_sketch)
+        step: Record estimate every N items (linear schedule)
+        schedule: 'linear', 'log' or 'hybrid'
+        budget: Number of checkpoints for log/hybrid (or linear) schedules
+    
+    Returns:
+        List of (position, estimate) tuples
+    """
+    sketch = make_sketch(sketch_type, sketch_params)
+    
+    n = len(stream)
+    positions = trace_positions(n, step, schedule, budget)
+    estimates = run_schedule(sketch, stream, positions)
+    
+    return trace_records(positions, estimates, n)
+
+
+def run_hashed_trace(ids, vocab_hashes, sketch_type='hll', sketch_params=None, step=1000,
+                     schedule='linear', budget=None):
+    """
+    run_with_trace for an encoded stream whose vocabulary was hashed once.
+    
+    Orderings and variants of one stream share vocab_hashes, so only the
+    first trace pays for hashing. ids may be a memory-mapped array (see
+    data/generate_stream.py). Estimates equal run_with_trace on vocab[ids].
+    
+    Args:
+        ids: Integer item IDs in stream order (see encode_ids)
+        vocab_hashes: make_sketch(sketch_type, sketch_params).hash_items(vocab)
+        sketch_type: Any type accepted by make_sketch() with add_hashes()
+        sketch_params: Dict of parameters (see make_sketch)
+        step: Record estimate every N items (linear schedule)
+        schedule: 'linear', 'log' or 'hybrid'
+        budget: Number of checkpoints for log/hybrid (or linear) schedules
+    
+    Returns:
+        List of (position, estimate) dicts, as run_with_trace
+    """
+    sketch = make_sketch(sketch_type, sketch_params)
+    
+    n = len(ids)
+    positions = trace_positions(n, step, schedule, budget)
+    estimates = run_hashed_schedule(sketch, ids, positions, vocab_hashes=vocab_hashes)
+    
+    return trace_records(positions, estimates, n)
+
+
+def run_runs_with_trace(items, counts, sketch_type='hll', sketch_params=None, step=1000,
+                        schedule='linear', budget=None):
+    """
+    Run-length encoded version of run_with_trace.
+    
+    items[j] repeated counts[j] times is the stream. Each run is hashed
+    and applied once while positions advance by its count; runs that
+    straddle a checkpoint are split there, so checkpoint positions (and
+    item totals such as KMVSketch.n) match the expanded stream exactly.
+    
+    Args:
+        items: Run items
+        counts: Run lengths (e.g. Wikipedia count_views per page)
+        sketch_type: Any type accepted by make_sketch()
+        sketch_params: Dict of parameters (see make_sketch)
+        step: Record estimate every N stream positions (linear schedule)
+        schedule: 'linear', 'log' or 'hybrid'
+        budget: Number of checkpoints for log/hybrid (or linear) schedules
+    
+    Returns:
+        List of (position, estimate) dicts, as run_with_trace
+    """
+    sketch = make_sketch(sketch_type, sketch_params)
+    
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts[counts > 0].sum())
+    positions = trace_positions(total, step, schedule, budget)
+    estimates = run_runs_schedule(sketch, items, counts, positions)
     
-    # Process stream
-    for i, item in enumerate(stream, 1):
-        sketch.add(item)
-        if i % step == 0:
-            est = sketch.count()
-            estimates.append({
-                'position': i,
-                'fraction_processed': i / len(stream),
-                'estimate': est
-            })
+    return trace_records(positions, estimates, total)
+
+
+def run_multi_trace(stream, sketch_type='multi_hll', sketch_params=None, step=1000,
+                    schedule='linear', budget=None):
+    """
+    run_with_trace for multi-run sketches: R independent runs, one pass.
+    
+    Args:
+        stream: List of items
+        sketch_type: 'multi_hll' or 'buffered_multi_hll'
+        sketch_params: Dict of parameters ('runs' sets R, see make_sketch)
+        step: Record estimate every N items (linear schedule)
+        schedule: 'linear', 'log' or 'hybrid'
+        budget: Number of checkpoints for log/hybrid (or linear) schedules
+    
+    Returns:
+        List of R traces, each in the run_with_trace format
+    """
+    sketch = make_sketch(sketch_type, sketch_params)
+    
+    n = len(stream)
+    positions = trace_positions(n, step, schedule, budget)
+    estimates = run_schedule(sketch, stream, positions)
+    
+    return [trace_records(positions, run_estimates, n) for run_estimates in estimates.T]
+
+
+def run_precision_trace(stream, precisions=range(4, 17), step=1000, schedule='linear', budget=None):
+    """
+    HLL traces for several precisions from one ingestion pass.
+    
+    Only a HyperLogLog at the highest precision is fed; at each checkpoint
+    its registers are folded down one precision at a time (see
+    HyperLogLog.fold), which gives exactly the registers a sketch of that
+    precision would hold. Estimates match HyperLogLog.count() up to float
+    summation order.
+    
+    Args:
+        stream: List of items
+        precisions: HLL precisions to trace
+        step: Record estimate every N items (linear schedule)
+        schedule: 'linear', 'log' or 'hybrid'
+        budget: Number of checkpoints for log/hybrid (or linear) schedules
+    
+    Returns:
+        Dict mapping each precision to a trace in the run_with_trace format
+    """
+    precisions = sorted(set(precisions), reverse=True)
+    sketch = HyperLogLog(p=precisions[0])
+    
+    alphas = {p: HyperLogLog(p=p).alpha for p in precisions}
+    
+    def estimate_all(hll):
+        registers = np.asarray(hll.registers, dtype=np.int64)
+        current = hll.p
+        estimates = []
+        for p in precisions:
+            registers = fold_registers(registers, current, p)
+            current = p
+            estimates.append(estimate_registers(registers, alphas[p]))
+        return estimates
+    
+    n = len(stream)
+    positions = trace_positions(n, step, schedule, budget)
+    estimates = run_schedule(sketch, stream, positions, estimator=estimate_all)
+    
+    return {
+        p: trace_records(positions, estimates[:, j], n)
+        for j, p in enumerate(precisions)
+    }
+
+
+def trace_records(positions, estimates, n):
+    """
+    Convert checkpoint arrays into the list-of-dicts trace format.
     
-    # Final estimate
-    est = sketch.count()
-    estimates.append({
-        'position': len(stream),
-        'fraction_processed': 1.0,
-        'estimate': est
-    })
+    Args:
+        positions: Checkpoint positions
+        estimates: Estimate at each position
+        n: Stream length
     
-    return estimates
+    Returns:
+        List of {'position', 'fraction_processed', 'estimate'} dicts
+    """
+    return [
+        {
+            'position': position,
+            'fraction_processed': position / n if n else 1.0,
+            'estimate': estimate
+        }
+        for position, estimate in zip(np.asarray(positions).tolist(), np.asarray(estimates).tolist())
+    ]
+
+
+def _metrics_dict(time_to, error_at, final_error, stability):
+    """Name the metric arrays of one run (or one cross-run mean); NaN -> None."""
+    def value(x):
+        x = float(x)
+        return None if np.isnan(x) else x
+    
+    metrics = {}
+    for threshold, position in zip(DEFAULT_THRESHOLDS, time_to):
+        metrics[f'time_to_{round(threshold * 100)}_percent'] = value(position)
+    for fraction, error in zip(DEFAULT_FRACTIONS, error_at):
+        metrics[f'early_{round(fraction * 100)}_percent_error'] = value(error)
+    metrics['final_error'] = value(final_error)
+    metrics['error_stability'] = value(stability)
+    return metrics
 
 
 def compute_convergence_metrics(estimates, true_count):
@@ -93,57 +329,65 @@ def compute_convergence_metrics(estimates, true_count):
     
     Returns:
         Dict with:
-        - time_to_5_percent: Position where error < 5%
-        - early_10_percent_error: Error at 10% of stream
-        - early_25_percent_error: Error at 25% of stream
-        - early_50_percent_error: Error at 50% of stream
+        - time_to_{1,2,5,10}_percent: First position where error < 1/2/5/10%
+        - early_10_percent_error: Error at the first checkpoint >= 10% of stream
+        - early_25_percent_error: Error at the first checkpoint >= 25% of stream
+        - early_50_percent_error: Error at the first checkpoint >= 50% of stream
         - final_error: Error at end of stream
-        - convergence_smoothness: Variance of error over time
+        - error_stability: Std dev of error over stream positions
     """
     if not estimates:
         return {}
     
-    # Compute errors for all estimates
-    errors = []
-    for est_data in estimates:
-        est = est_data['estimate']
-        rel_error = abs(est - true_count) / true_count
-        errors.append(rel_error)
-    
-    metrics = {}
+    positions, values = traces_to_arrays([estimates])
+    per_run = convergence_metrics(values, positions, true_count)['per_run']
+    metrics = _metrics_dict(per_run['time_to'][0], per_run['error_at'][0],
+                            per_run['final_error'][0], per_run['stability'][0])
+    for key, value in metrics.items():
+        if key.startswith('time_to_') and value is not None:
+            metrics[key] = int(value)
+    return metrics
+
+
+def average_convergence_metrics(traces, true_count):
+    """
+    Metrics of several runs over the same checkpoints, averaged across runs.
     
-    # Time to accuracy (first position < 5%)
-    time_to_5 = None
-    for est_data, error in zip(estimates, errors):
-        if error < 0.05:
-            time_to_5 = est_data['position']
-            break
-    metrics['time_to_5_percent'] = time_to_5
-    
-    # Early-stage errors
-    early_10_idx = int(len(estimates) * 0.1)
-    early_25_idx = int(len(estimates) * 0.25)
-    early_50_idx = int(len(estimates) * 0.50)
-    
-    metrics['early_10_percent_error'] = errors[early_10_idx] if early_10_idx < len(errors) else None
-    metrics['early_25_percent_error'] = errors[early_25_idx] if early_25_idx < len(errors) else None
-    metrics['early_50_percent_error'] = errors[early_50_idx] if early_50_idx < len(errors) else None
-    metrics['final_error'] = errors[-1]
-    
-    # Stability (std dev of errors)
-    if len(errors) > 1:
-        mean_error = sum(errors) / len(errors)
-        variance = sum((e - mean_error) ** 2 for e in errors) / len(errors)
-        metrics['error_stability'] = variance ** 0.5
-    else:
-        metrics['error_stability'] = 0
+    Runs where a metric is undefined (a threshold never reached) are left
+    out of its mean. 'confidence_intervals' holds the 95% interval of
+    every mean.
     
-    return metrics
+    Returns:
+        Dict with the keys of compute_convergence_metrics (missing when no
+        run defines the metric) plus 'confidence_intervals'
+    """
+    positions, values = traces_to_arrays(traces)
+    summary = convergence_metrics(values, positions, true_count)['summary']
+    
+    def named(stat):
+        return _metrics_dict(summary['time_to'][stat], summary['error_at'][stat],
+                             summary['final_error'][stat], summary['stability'][stat])
+    
+    means = named('mean')
+    lows = named('ci_low')
+    highs = named('ci_high')
+    avg_metrics = {key: value for key, value in means.items() if value is not None}
+    avg_metrics['confidence_intervals'] = {
+        key: (lows[key], highs[key]) for key in avg_metrics
+    }
+    return avg_metrics
 
 
-def run_convergence_experiment(stream_path, num_runs=3):
+def run_convergence_experiment(stream_path, num_runs=3, seed=42, schedule='linear', budget=None):
     """
     Run complete convergence experiment across all stream orders.
+
+    Args:
+        stream_path: Path to the stream file
+        num_runs: Runs per sketch variant
+        seed: Key of the permutation used for the random order
+        schedule: Checkpoint schedule for every trace ('linear', 'log', 'hybrid')
+        budget: Checkpoints per trace (None keeps step=1000 for 'linear')
     """
     stream = load_stream(stream_path)
     true_count = len(set(stream))
@@ -160,22 +404,15 @@ def run_convergence_experiment(stream_path, num_runs=3):
     orders = {}
     orders['original'] = stream[:]
     
-    shuffled = stream[:]
-    random.shuffle(shuffled)
-    orders['random'] = shuffled
+    # Reproducible random order without copying and shuffling the list
+    orders['random'] = [stream[j] for j in FeistelPermutation(len(stream), seed=seed)]
     
     # Chunk-shuffled
-    chunked = []
-    chunk_size = 1000
-    for i in range(0, len(stream), chunk_size):
-        chunk = stream[i:i + chunk_size]
-        random.shuffle(chunk)
-        chunked.extend(chunk)
-    orders['chunk_shuffled'] = chunked
+    ids, _ = encode_ids(stream)
+    orders['chunk_shuffled'] = apply_order(stream, chunk_shuffled_order(len(stream), 1000, seed=seed))
     
     # Grouped (sorted) order
-    grouped = sorted(stream)
-    orders['grouped'] = grouped
+    orders['grouped'] = apply_order(stream, grouped_order(ids))
     
     # Store all results
     all_results = {}
@@ -187,23 +424,13 @@ def run_convergence_experiment(stream_path, num_runs=3):
         
         order_results = {}
         
-        # HyperLogLog convergence
+        # HyperLogLog convergence: num_runs independent hash functions, one pass
         print(f"HyperLogLog convergence (p=10):")
-        hll_traces = []
-        hll_metrics_list = []
-        
-        for run in range(num_runs):
-            trace = run_with_trace(ordered_stream, 'hll', {'p': 10}, step=1000)
-            hll_traces.append(trace)
-            metrics = compute_convergence_metrics(trace, true_count)
-            hll_metrics_list.append(metrics)
+        hll_traces = run_multi_trace(ordered_stream, 'multi_hll', {'p': 10, 'runs': num_runs},
+                                     step=1000, schedule=schedule, budget=budget)
         
         # Average metrics across runs
-        hll_avg_metrics = {}
-        for key in hll_metrics_list[0].keys():
-            values = [m[key] for m in hll_metrics_list if m[key] is not None]
-            if values:
-                hll_avg_metrics[key] = sum(values) / len(values)
+        hll_avg_metrics = average_convergence_metrics(hll_traces, true_count)
         
         print(f"  Time to 5% accuracy:     {hll_avg_metrics.get('time_to_5_percent', 'N/A')} items")
         print(f"  Error @ 10% of stream:   {hll_avg_metrics.get('early_10_percent_error', 'N/A')*100:.2f}%")
@@ -220,19 +447,13 @@ def run_convergence_experiment(stream_path, num_runs=3):
         # Flajolet-Martin convergence
         print(f"\nFlajolet-Martin convergence (64 hashes):")
         fm_traces = []
-        fm_metrics_list = []
         
         for run in range(num_runs):
-            trace = run_with_trace(ordered_stream, 'fm', {'num_hashes': 64}, step=1000)
+            trace = run_with_trace(ordered_stream, 'fm', {'num_hashes': 64}, step=1000,
+                                   schedule=schedule, budget=budget)
             fm_traces.append(trace)
-            metrics = compute_convergence_metrics(trace, true_count)
-            fm_metrics_list.append(metrics)
         
-        fm_avg_metrics = {}
-        for key in fm_metrics_list[0].keys():
-            values = [m[key] for m in fm_metrics_list if m[key] is not None]
-            if values:
-                fm_avg_metrics[key] = sum(values) / len(values)
+        fm_avg_metrics = average_convergence_metrics(fm_traces, true_count)
         
         print(f"  Time to 5% accuracy:     {fm_avg_metrics.get('time_to_5_percent', 'N/A')} items")
         print(f"  Error @ 10% of stream:   {fm_avg_metrics.get('early_10_percent_error', 'N/A')*100:.2f}%")
@@ -254,25 +475,16 @@ def run_convergence_experiment(stream_path, num_runs=3):
     print(f"{'='*70}\n")
     
     grouped_stream = orders['grouped']
-    buffered_traces = []
-    buffered_metrics_list = []
-    
-    for run in range(num_runs):
-        trace = run_with_trace(
-            grouped_stream,
-            'buffered_hll',
-            {'p': 10, 'buffer_size': 500},
-            step=1000
-        )
-        buffered_traces.append(trace)
-        metrics = compute_convergence_metrics(trace, true_count)
-        buffered_metrics_list.append(metrics)
-    
-    buffered_avg_metrics = {}
-    for key in buffered_metrics_list[0].keys():
-        values = [m[key] for m in buffered_metrics_list if m[key] is not None]
-        if values:
-            buffered_avg_metrics[key] = sum(values) / len(values)
+    buffered_traces = run_multi_trace(
+        grouped_stream,
+        'buffered_multi_hll',
+        {'p': 10, 'runs': num_runs, 'buffer_size': 500},
+        step=1000,
+        schedule=schedule,
+        budget=budget
+    )
+    
+    buffered_avg_metrics = average_convergence_metrics(buffered_traces, true_count)
     
     print(f"  Time to 5% accuracy:     {buffered_avg_metrics.get('time_to_5_percent', 'N/A')} items")
     print(f"  Error @ 10% of stream:   {buffered_avg_metrics.get('early_10_percent_error', 'N/A')*100:.2f}%")
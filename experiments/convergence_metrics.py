@@ -0,0 +1,188 @@
+"""
+Vectorized Convergence Metrics
+
+NumPy versions of the trace metrics in convergence.py, computed for a
+whole array of traces at once. Estimates are shaped (..., runs,
+checkpoints) with one positions vector shared by every trace, so a
+parameter sweep can stack all of its traces into one array and get
+time-to-epsilon for several thresholds, errors at chosen stream
+fractions, stability, and cross-run means with confidence intervals in
+a single pass.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+
+DEFAULT_THRESHOLDS = (0.01, 0.02, 0.05, 0.10)
+DEFAULT_FRACTIONS = (0.10, 0.25, 0.50)
+
+
+def traces_to_arrays(traces):
+    """
+    Stack list-of-dict traces (as returned by run_with_trace) into arrays.
+
+    Args:
+        traces: List of traces sharing the same checkpoint positions
+
+    Returns:
+        Tuple of (positions, estimates) with estimates shaped (runs, checkpoints)
+    """
+    positions = np.array([point['position'] for point in traces[0]], dtype=np.int64)
+    estimates = np.array([[point['estimate'] for point in trace] for trace in traces], dtype=np.float64)
+    return positions, estimates
+
+
+def relative_errors(estimates, true_count):
+    """
+    |estimate - truth| / truth for every checkpoint.
+
+    Args:
+        estimates: Array shaped (..., checkpoints)
+        true_count: Scalar, or any array broadcastable against estimates,
+                    e.g. (checkpoints,) for the running distinct count or
+                    (runs, 1) for a per-run truth
+
+    Returns:
+        float64 array shaped like estimates
+    """
+    true_count = np.asarray(true_count, dtype=np.float64)
+    return np.abs(np.asarray(estimates, dtype=np.float64) - true_count) / true_count
+
+
+def time_to_thresholds(errors, positions, thresholds=DEFAULT_THRESHOLDS):
+    """
+    First position where the error drops below each threshold.
+
+    Args:
+        errors: Relative errors shaped (..., checkpoints)
+        positions: Checkpoint positions shaped (checkpoints,)
+        thresholds: Error thresholds (fractions, e.g. 0.05 for 5%)
+
+    Returns:
+        float64 array shaped (..., thresholds); NaN where never reached
+    """
+    positions = np.asarray(positions)
+    # The running minimum is non-increasing, so the number of checkpoints
+    # still at or above a threshold is the index of the first one below it
+    running_min = np.minimum.accumulate(errors, axis=-1)
+    result = np.empty(errors.shape[:-1] + (len(thresholds),), dtype=np.float64)
+    for t, threshold in enumerate(thresholds):
+        first = np.count_nonzero(running_min >= threshold, axis=-1)
+        reached = first < len(positions)
+        result[..., t] = np.where(reached, positions[np.minimum(first, len(positions) - 1)], np.nan)
+    return result
+
+
+def errors_at_fractions(errors, positions, fractions=DEFAULT_FRACTIONS):
+    """
+    Error at the first checkpoint at or past each fraction of the stream.
+
+    Args:
+        errors: Relative errors shaped (..., checkpoints)
+        positions: Checkpoint positions; the last one is the stream length
+        fractions: Stream fractions in (0, 1]
+
+    Returns:
+        float64 array shaped (..., fractions); NaN past the last checkpoint
+    """
+    positions = np.asarray(positions)
+    targets = np.asarray(fractions, dtype=np.float64) * positions[-1]
+    # Tolerance so 0.1 * n lands on position n / 10 despite float rounding
+    idx = np.searchsorted(positions, targets * (1 - 1e-12), side='left')
+    valid = idx < len(positions)
+    picked = errors[..., np.minimum(idx, len(positions) - 1)]
+    return np.where(valid, picked, np.nan)
+
+
+def error_stability(errors, positions):
+    """
+    Standard deviation of the error over stream positions.
+
+    Each checkpoint is weighted by the number of items since the previous
+    one, so the value does not depend on how checkpoints are spaced.
+
+    Returns:
+        float64 array shaped errors.shape[:-1]
+    """
+    weights = np.diff(np.asarray(positions, dtype=np.float64), prepend=0.0)
+    total = weights.sum()
+    if errors.shape[-1] < 2 or total <= 0:
+        return np.zeros(errors.shape[:-1])
+    mean = errors @ weights / total
+    return np.sqrt(((errors - mean[..., None]) ** 2) @ weights / total)
+
+
+def summarize_runs(values, axis=0, confidence=0.95):
+    """
+    Cross-run mean and normal-approximation confidence interval.
+
+    NaN entries (e.g. a threshold a run never reached) are left out.
+
+    Args:
+        values: Per-run metric array
+        axis: Run axis
+        confidence: Two-sided confidence level
+
+    Returns:
+        Dict of arrays: mean, std, ci_low, ci_high, count
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count = np.count_nonzero(~np.isnan(values), axis=axis)
+    safe = np.maximum(count, 1)
+    total = np.nansum(values, axis=axis)
+    mean = np.where(count > 0, total / safe, np.nan)
+    sq = np.nansum((values - np.expand_dims(mean, axis)) ** 2, axis=axis)
+    std = np.where(count > 1, np.sqrt(sq / np.maximum(count - 1, 1)), 0.0)
+    std = np.where(count > 0, std, np.nan)
+    half = NormalDist().inv_cdf(0.5 + confidence / 2) * std / np.sqrt(safe)
+    return {
+        'mean': mean,
+        'std': std,
+        'ci_low': mean - half,
+        'ci_high': mean + half,
+        'count': count
+    }
+
+
+def convergence_metrics(estimates, positions, true_count, thresholds=DEFAULT_THRESHOLDS,
+                        fractions=DEFAULT_FRACTIONS, confidence=0.95):
+    """
+    All convergence metrics for an array of traces in one pass.
+
+    Args:
+        estimates: Array shaped (..., runs, checkpoints)
+        positions: Checkpoint positions shaped (checkpoints,)
+        true_count: Ground truth, broadcastable against estimates
+        thresholds: Error thresholds for time-to-epsilon
+        fractions: Stream fractions for early errors
+        confidence: Confidence level of the cross-run intervals
+
+    Returns:
+        Dict with 'per_run' arrays (time_to: (..., runs, thresholds),
+        error_at: (..., runs, fractions), final_error and stability:
+        (..., runs)) and 'summary', the same metrics reduced over runs by
+        summarize_runs()
+    """
+    estimates = np.asarray(estimates, dtype=np.float64)
+    positions = np.asarray(positions)
+    errors = relative_errors(estimates, true_count)
+
+    per_run = {
+        'time_to': time_to_thresholds(errors, positions, thresholds),
+        'error_at': errors_at_fractions(errors, positions, fractions),
+        'final_error': errors[..., -1],
+        'stability': error_stability(errors, positions)
+    }
+    run_axis = estimates.ndim - 2
+    summary = {
+        name: summarize_runs(values, axis=run_axis, confidence=confidence)
+        for name, values in per_run.items()
+    }
+    return {
+        'thresholds': tuple(thresholds),
+        'fractions': tuple(fractions),
+        'per_run': per_run,
+        'summary': summary
+    }
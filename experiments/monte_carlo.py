@@ -0,0 +1,206 @@
+"""
+Monte Carlo Permutation Engine
+
+Distribution of convergence behaviour over many uniformly random
+orderings of one stream, instead of the single shuffle stored in
+data/*_items_random.txt.
+
+Only the first occurrence of an item can change an HLL or KMV sketch,
+so each permutation reduces to "at which checkpoint does item u first
+appear". Items are hashed once per distinct value; a batch of
+permutations is then drawn with one vectorized RNG call and turned into
+checkpoint curves with scatter-max (HLL) or a cumulative count in hash
+order (KMV). Batches are spread over worker processes.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sketches.hashing import hash64_many, bit_length
+from sketches.hll import HyperLogLog
+from sketches.multi_hll import estimate_registers
+from experiments.orderings import encode_ids
+from experiments.checkpoints import make_schedule
+from experiments.convergence_metrics import relative_errors, time_to_thresholds
+
+
+PERCENTILES = (5, 25, 50, 75, 95)
+MAX_HASH = float(1 << 64)  # KMVSketch.max_hash
+
+
+def _first_positions(inverse, by_id, group_start):
+    """1-based position of each distinct item's first occurrence, per permutation."""
+    return np.minimum.reduceat(inverse[:, by_id], group_start, axis=1) + 1
+
+
+def _hll_curves(segments, reg_idx, rho, num_checkpoints, p):
+    """HLL estimate at every checkpoint for each row of segments."""
+    m = 1 << p
+    num_perms = segments.shape[0]
+    registers = np.zeros((num_perms, num_checkpoints + 1, m), dtype=np.uint8)
+    rows = np.arange(num_perms)[:, None]
+    flat = (rows * (num_checkpoints + 1) + segments) * m + reg_idx[None, :]
+    np.maximum.at(registers.reshape(-1), flat.ravel(), np.broadcast_to(rho, segments.shape).ravel())
+    # Registers at checkpoint s are the max over segments 0..s
+    registers = np.maximum.accumulate(registers[:, :num_checkpoints], axis=1)
+    return estimate_registers(registers, HyperLogLog(p).alpha)
+
+
+def _kmv_curves(segments, hash_order, kmv_hashes, positions, k):
+    """KMV estimate at every checkpoint for each row of segments."""
+    num_checkpoints = len(positions)
+    curves = np.empty((segments.shape[0], num_checkpoints), dtype=np.float64)
+    checkpoint = np.arange(num_checkpoints)[:, None]
+    for row, seg in enumerate(segments):
+        # seen[s, j]: j-th smallest hash has arrived by checkpoint s
+        seen = seg[hash_order][None, :] <= checkpoint
+        counts = np.cumsum(seen, axis=1, dtype=np.int32)
+        total = counts[:, -1]
+        kth = np.argmax(counts >= k, axis=1)
+        k_min = kmv_hashes[kth]
+        estimate = np.where(k_min > 0, (k - 0.5) * MAX_HASH / np.maximum(k_min, 1), positions)
+        curves[row] = np.where(total < k, total, estimate)
+    return curves
+
+
+def _simulate_chunk(task):
+    """Worker: draw a batch of permutations and return their curves."""
+    seed_seq, num_perms, data = task
+    rng = np.random.default_rng(seed_seq)
+    n = data['n']
+
+    # A uniformly random permutation's inverse is uniform too, so draw the
+    # position of every stream index directly
+    inverse = rng.permuted(np.broadcast_to(np.arange(n, dtype=np.int64), (num_perms, n)), axis=1)
+    first = _first_positions(inverse, data['by_id'], data['group_start'])
+    segments = np.searchsorted(data['positions'], first, side='left')
+
+    num_checkpoints = len(data['positions'])
+    curves = {}
+    if 'hll' in data['sketches']:
+        curves['hll'] = _hll_curves(segments, data['reg_idx'], data['rho'], num_checkpoints, data['p'])
+    if 'kmv' in data['sketches']:
+        curves['kmv'] = _kmv_curves(segments, data['hash_order'], data['kmv_hashes'], data['positions'], data['k'])
+    return curves
+
+
+def monte_carlo_orderings(items, num_permutations=200, sketches=('hll', 'kmv'), p=10, k=512,
+                          schedule='linear', budget=100, seed=0, workers=None, chunk_size=16):
+    """
+    Convergence curves of HLL/KMV over many random orderings of a stream.
+
+    Curves are exact: row i equals running HyperLogLog(p) / KMVSketch(k)
+    over the i-th permuted stream and reading it at each checkpoint.
+
+    Args:
+        items: Stream items (or an int ID array from encode_ids)
+        num_permutations: Number of random orderings P
+        sketches: Any of 'hll', 'kmv'
+        p: HLL precision
+        k: KMV size
+        schedule: Checkpoint schedule ('linear', 'log', 'hybrid')
+        budget: Checkpoints per curve
+        seed: Seed of the permutation stream (results do not depend on workers)
+        workers: Worker processes (None: os.cpu_count(); 1 runs inline)
+        chunk_size: Permutations per task
+
+    Returns:
+        Dict with positions, true_count and, per sketch, 'estimates' (P, checkpoints),
+        'time_to_5_percent' (P,), error 'bands' per percentile and
+        'time_to_5_percentiles'
+    """
+    ids, vocab = encode_ids(items)
+    n = len(ids)
+    hashes = hash64_many(vocab.tolist())
+    positions = make_schedule(n, schedule, budget)
+
+    by_id = np.argsort(ids, kind='stable')
+    sorted_ids = ids[by_id]
+    group_start = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+
+    data = {
+        'n': n,
+        'by_id': by_id,
+        'group_start': group_start,
+        'positions': positions,
+        'sketches': tuple(sketches),
+        'p': p,
+        'k': k
+    }
+    if 'hll' in sketches:
+        data['reg_idx'] = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        w = hashes & np.uint64((1 << (64 - p)) - 1)
+        data['rho'] = ((64 - p) - bit_length(w) + 1).astype(np.uint8)
+    if 'kmv' in sketches:
+        hash_order = np.argsort(hashes, kind='stable')
+        data['hash_order'] = hash_order
+        data['kmv_hashes'] = hashes[hash_order].astype(np.float64)
+
+    sizes = [min(chunk_size, num_permutations - lo) for lo in range(0, num_permutations, chunk_size)]
+    children = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(child, size, data) for child, size in zip(children, sizes)]
+
+    if workers == 1:
+        chunks = [_simulate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_simulate_chunk, tasks))
+
+    true_count = len(vocab)
+    results = {'positions': positions, 'true_count': true_count, 'num_permutations': num_permutations}
+    for name in sketches:
+        estimates = np.concatenate([chunk[name] for chunk in chunks], axis=0)
+        errors = relative_errors(estimates, true_count)
+        time_to_5 = time_to_thresholds(errors, positions, (0.05,))[:, 0]
+        reached = ~np.isnan(time_to_5)
+        results[name] = {
+            'estimates': estimates,
+            'time_to_5_percent': time_to_5,
+            'reached_5_percent': float(reached.mean()),
+            'bands': dict(zip(PERCENTILES, np.percentile(errors, PERCENTILES, axis=0))),
+            'time_to_5_percentiles': dict(zip(
+                PERCENTILES,
+                np.percentile(time_to_5[reached], PERCENTILES).tolist() if reached.any() else [None] * len(PERCENTILES)
+            ))
+        }
+    return results
+
+
+def main():
+    """Time-to-5% percentile bands over random orderings of each real dataset."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(script_dir), 'data')
+    datasets = {
+        'Wikipedia': 'wikipedia_items_chrono.txt',
+        'GitHub': 'github_items_chrono.txt',
+        'Common Crawl': 'commoncrawl_items_chrono.txt',
+        'Enron': 'enron_items_chrono.txt',
+    }
+
+    print("=" * 80)
+    print("MONTE CARLO ORDER SENSITIVITY (200 random orderings per dataset)")
+    print("=" * 80)
+
+    for name, filename in datasets.items():
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            print(f"\n{name}: {filename} not found, skipping")
+            continue
+        with open(path) as f:
+            items = [line.strip() for line in f if line.strip()]
+
+        results = monte_carlo_orderings(items, num_permutations=200, seed=42)
+        print(f"\n{name}: {len(items):,} items, {results['true_count']:,} unique")
+        for sketch in ('hll', 'kmv'):
+            bands = results[sketch]['time_to_5_percentiles']
+            row = '  '.join(f"p{q}={bands[q]:,.0f}" if bands[q] is not None else f"p{q}=N/A" for q in PERCENTILES)
+            print(f"  {sketch.upper():4s} time to 5%: {row}  (reached in {results[sketch]['reached_5_percent']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Stream Ordering Transforms
+
+Linear or O(n log n) NumPy builders for the stream orderings studied in
+this project. Items are first encoded as integer IDs; every builder then
+returns a permutation array `order` such that `ids[order]` (or
+`apply_order(items, order)`) is the reordered stream.
+"""
+
+import numpy as np
+
+
+def encode_ids(items):
+    """
+    Encode a stream of items as integer IDs.
+
+    IDs follow the lexicographic order of the distinct items, so sorting
+    by ID is the same as sorting the items themselves.
+
+    Args:
+        items: Sequence of stream items
+
+    Returns:
+        Tuple of (ids, vocab) where vocab[ids[i]] == items[i]; vocab is an
+        object array unless items is already a numeric array
+    """
+    if isinstance(items, np.ndarray) and items.dtype != object:
+        vocab, ids = np.unique(items, return_inverse=True)
+        return ids.astype(np.int64).ravel(), vocab
+
+    # Factorize with a dict: np.asarray() of strings would build a
+    # fixed-width unicode array padded to the longest item
+    index = {}
+    ids = np.fromiter((index.setdefault(item, len(index)) for item in items), dtype=np.int64, count=len(items))
+    vocab = np.fromiter(index, dtype=object, count=len(index))
+    by_value = np.argsort(vocab, kind='stable')
+    rank = np.empty(len(vocab), dtype=np.int64)
+    rank[by_value] = np.arange(len(vocab))
+    return rank[ids], vocab[by_value]
+
+
+def apply_order(items, order):
+    """Materialize `items` in the order given by a permutation array."""
+    if isinstance(items, np.ndarray):
+        return items[order]
+    return [items[i] for i in order.tolist()]
+
+
+def _occurrence_rank(ids):
+    """For each position, how many earlier positions hold the same ID."""
+    by_id = np.argsort(ids, kind='stable')
+    sorted_ids = ids[by_id]
+    group_start = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    group_len = np.diff(np.r_[group_start, len(ids)])
+    rank = np.empty(len(ids), dtype=np.int64)
+    rank[by_id] = np.arange(len(ids)) - np.repeat(group_start, group_len)
+    return rank
+
+
+def random_order(n, seed=None):
+    """Uniformly random permutation of [0, n)."""
+    return np.random.default_rng(seed).permutation(n)
+
+
+def reversed_order(n):
+    """Stream played back to front."""
+    return np.arange(n - 1, -1, -1, dtype=np.int64)
+
+
+def grouped_order(ids):
+    """
+    All occurrences of each item made contiguous, items in ID order.
+
+    Equivalent to sorted(items) when IDs come from encode_ids().
+    """
+    return np.argsort(ids, kind='stable')
+
+
+def hot_first_order(ids, num_hot=None):
+    """
+    Most frequent items first, each as one contiguous run.
+
+    Args:
+        ids: Integer ID array
+        num_hot: Only pull the num_hot most frequent items to the front;
+                 the remaining items keep their original relative order.
+                 None groups every item by descending frequency.
+
+    Returns:
+        Permutation array
+    """
+    counts = np.bincount(ids)
+    # Rank items by frequency (ties broken by ID) and look up per position
+    by_freq = np.lexsort((np.arange(len(counts)), -counts))
+    freq_rank = np.empty(len(counts), dtype=np.int64)
+    freq_rank[by_freq] = np.arange(len(counts))
+    position_rank = freq_rank[ids]
+
+    if num_hot is not None:
+        # Cold positions share one rank after the hot items, so the stable
+        # sort leaves them in stream order
+        position_rank = np.minimum(position_rank, num_hot)
+    return np.argsort(position_rank, kind='stable')
+
+
+def chunk_shuffled_order(n, chunk_size=1000, seed=None):
+    """
+    Shuffle within consecutive chunks, keeping chunk order.
+
+    Args:
+        n: Stream length
+        chunk_size: Items per chunk
+        seed: Seed or numpy Generator
+
+    Returns:
+        Permutation array
+    """
+    rng = np.random.default_rng(seed)
+    chunk = np.arange(n) // chunk_size
+    return np.lexsort((rng.random(n), chunk))
+
+
+def interleaved_order(ids):
+    """
+    Round-robin over distinct items: first occurrences, then second, ...
+
+    Spreads repeats as far apart as possible (the opposite of grouping).
+    """
+    return np.argsort(_occurrence_rank(ids), kind='stable')
+
+
+def burst_injected_order(ids, num_bursts=50, seed=None):
+    """
+    Random order with bursts: a few items have all their occurrences
+    collapsed into one contiguous run at a random point in the stream.
+
+    Args:
+        ids: Integer ID array
+        num_bursts: Number of distinct items turned into bursts
+        seed: Seed or numpy Generator
+
+    Returns:
+        Permutation array
+    """
+    rng = np.random.default_rng(seed)
+    n = len(ids)
+    num_items = int(ids.max()) + 1 if n else 0
+    burst_items = rng.choice(num_items, size=min(num_bursts, num_items), replace=False)
+
+    # Each position sorts by a random key; burst items share one key per item
+    keys = rng.random(n)
+    item_key = np.full(num_items, -1.0)
+    item_key[burst_items] = rng.random(len(burst_items))
+    in_burst = item_key[ids] >= 0
+    keys[in_burst] = item_key[ids[in_burst]]
+    return np.lexsort((np.arange(n), keys))
@@ -0,0 +1,116 @@
+"""
+Seeded Pseudo-Random Permutations
+
+Keyed Feistel network over [0, n) that maps an output position to an
+input position on the fly. Random-order streams can then be replayed
+without materializing (or shuffling) the whole stream in memory, and a
+new ordering is just a new seed.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sketches.hashing import mix64
+
+
+MASK64 = (1 << 64) - 1
+CHUNK_SIZE = 65536  # Positions mapped per vectorized call when iterating
+
+
+def _round_keys(seed, rounds):
+    """Derive one 64-bit key per Feistel round from the seed."""
+    # SplitMix64: the i-th key mixes seed + i * golden-ratio increment
+    states = [(seed + (i + 1) * 0x9E3779B97F4A7C15) & MASK64 for i in range(rounds)]
+    return list(mix64(np.array(states, dtype=np.uint64)))
+
+
+class FeistelPermutation:
+    """
+    Reproducible pseudo-random permutation of [0, n).
+
+    A balanced Feistel network permutes the smallest even-width power of
+    two covering n; cycle-walking re-applies it to the few indices that
+    land outside [0, n). Memory use is O(1) regardless of n.
+
+    Args:
+        n: Size of the permuted range
+        seed: Integer key; each seed gives an independent ordering
+        rounds: Number of Feistel rounds (4 is enough for shuffling)
+    """
+
+    def __init__(self, n, seed=0, rounds=4):
+        """
+        Initialize the permutation.
+
+        Args:
+            n: Number of positions (stream length)
+            seed: Permutation key
+            rounds: Number of Feistel rounds
+        """
+        if n <= 0:
+            raise ValueError("n must be positive")
+        if rounds <= 0:
+            raise ValueError("rounds must be positive")
+
+        self.n = n
+        self.seed = seed
+        self.rounds = rounds
+
+        # Split the domain into two halves of equal bit width
+        bits = max(2, (n - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = np.uint64((1 << self.half_bits) - 1)
+        self.domain = 1 << (2 * self.half_bits)
+        self._keys = _round_keys(seed, rounds)
+
+    def __len__(self):
+        return self.n
+
+    def _encrypt(self, x):
+        """One pass of the Feistel network over the full 2^(2*half_bits) domain."""
+        shift = np.uint64(self.half_bits)
+        left = x >> shift
+        right = x & self.half_mask
+        for key in self._keys:
+            f = mix64(right ^ key) & self.half_mask
+            left, right = right, left ^ f
+        return (left << shift) | right
+
+    def indices(self, start=0, stop=None):
+        """
+        Map a contiguous block of output positions to input positions.
+
+        Args:
+            start: First output position
+            stop: One past the last output position (default n)
+
+        Returns:
+            int64 array where result[i] is the input index for position start + i
+        """
+        if stop is None:
+            stop = self.n
+        if not 0 <= start <= stop <= self.n:
+            raise IndexError(f"range [{start}, {stop}) outside [0, {self.n})")
+
+        # Cycle-walking: re-encrypt values that land outside [0, n) until
+        # they fall back in range, which restricts the network to [0, n)
+        x = self._encrypt(np.arange(start, stop, dtype=np.uint64))
+        outside = np.flatnonzero(x >= self.n)
+        while outside.size:
+            x[outside] = self._encrypt(x[outside])
+            outside = outside[x[outside] >= self.n]
+        return x.astype(np.int64)
+
+    def __getitem__(self, position):
+        """Input index for a single output position."""
+        if position < 0:
+            position += self.n
+        return int(self.indices(position, position + 1)[0])
+
+    def __iter__(self):
+        for start in range(0, self.n, CHUNK_SIZE):
+            yield from self.indices(start, min(start + CHUNK_SIZE, self.n)).tolist()
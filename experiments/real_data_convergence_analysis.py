@@ -17,6 +17,12 @@ import math
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from experiments.checkpoints import make_schedule, run_schedule
+
 class SimpleHyperLogLog:
     """HyperLogLog cardinality estimator - SHA1 based"""
     
@@ -70,40 +76,35 @@ def load_stream_from_file(filepath, limit=None):
             items.append(line.strip())
     return items
 
-def analyze_convergence(items, dataset_name, ordering_name):
-    """Run convergence test"""
+def analyze_convergence(items, dataset_name, ordering_name, schedule='linear', budget=20):
+    """Run convergence test (schedule/budget as in experiments.checkpoints.make_schedule)"""
     hll = SimpleHyperLogLog(p=10)
     convergence = []
-    checkpoint_interval = max(1, len(items) // 20)  # 20 checkpoints
     
     true_unique = len(set(items))
     time_to_5pct = len(items)
     final_error = 0
     
-    for i, item in enumerate(items):
-        hll.add(item)
-        
-        # Check at intervals
-        if (i + 1) % checkpoint_interval == 0 or i == len(items) - 1:
-            estimate = hll.cardinality()
-            if estimate < 1:
-                estimate = 1
-            
-            error = abs(estimate - true_unique) / true_unique * 100
-            pct = 100 * (i + 1) / len(items)
-            
-            convergence.append({
-                'items': i + 1,
-                'pct': round(pct, 1),
-                'estimate': round(estimate),
-                'error': round(error, 2)
-            })
-            
-            # Track time to 5% error
-            if error <= 5.0 and time_to_5pct == len(items):
-                time_to_5pct = i + 1
-            
-            final_error = error
+    # Estimate only at the checkpoints; items in between go in as one batch
+    positions = make_schedule(len(items), schedule, budget)
+    estimates = run_schedule(hll, items, positions, estimator=SimpleHyperLogLog.cardinality)
+    estimates = np.maximum(estimates, 1)
+    errors = np.abs(estimates - true_unique) / true_unique * 100
+    
+    for position, estimate, error in zip(positions.tolist(), estimates.tolist(), errors.tolist()):
+        convergence.append({
+            'items': position,
+            'pct': round(100 * position / len(items), 1),
+            'estimate': round(estimate),
+            'error': round(error, 2)
+        })
+    
+    # Track time to 5% error
+    within = np.flatnonzero(errors <= 5.0)
+    if within.size:
+        time_to_5pct = int(positions[within[0]])
+    if errors.size:
+        final_error = float(errors[-1])
     
     return {
         'dataset': dataset_name,
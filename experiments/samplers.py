@@ -0,0 +1,94 @@
+"""
+Discrete Samplers
+
+Vectorized sampling of ranks from a fixed discrete distribution, for
+Zipfian and empirical-frequency synthetic streams. The cumulative
+distribution is computed once; every call then draws a batch of
+uniforms from a NumPy Generator and maps them to ranks with one binary
+search (np.searchsorted), so millions of ranks cost one call.
+"""
+
+import numpy as np
+
+
+class DiscreteSampler:
+    """
+    Inverse-CDF sampler over ranks 0..n-1 with the given weights.
+
+    Rank i is drawn with probability weights[i] / sum(weights); ranks of
+    weight 0 are never drawn.
+
+    Args:
+        weights: Non-negative weights, one per rank
+    """
+
+    def __init__(self, weights):
+        """
+        Precompute the cumulative distribution.
+
+        Args:
+            weights: 1-D array of non-negative weights with a positive sum
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or weights.size == 0:
+            raise ValueError("weights must be a non-empty 1-D array")
+        if (weights < 0).any() or not np.isfinite(weights).all():
+            raise ValueError("weights must be finite and non-negative")
+
+        cdf = np.cumsum(weights)
+        if cdf[-1] <= 0:
+            raise ValueError("weights must have a positive sum")
+
+        self.n = len(weights)
+        self.cdf = cdf / cdf[-1]
+
+    def probabilities(self):
+        """Probability of every rank."""
+        return np.diff(self.cdf, prepend=0.0)
+
+    def sample(self, size, seed=None):
+        """
+        Draw ranks.
+
+        Args:
+            size: Number of ranks (or an output shape)
+            seed: Seed or np.random.Generator
+
+        Returns:
+            int64 array of ranks in [0, n)
+        """
+        rng = np.random.default_rng(seed)
+        # u < 1 and cdf[-1] == 1, so the search never runs past the last rank
+        return np.searchsorted(self.cdf, rng.random(size), side='right')
+
+
+def zipf_weights(n, exponent=1.0):
+    """Zipf weights 1 / k^exponent for ranks k = 1..n."""
+    return np.arange(1, n + 1, dtype=np.float64) ** -exponent
+
+
+class ZipfSampler(DiscreteSampler):
+    """
+    Finite Zipf distribution: rank k (0-based) has probability ~ 1 / (k+1)^exponent.
+
+    Unlike np.random.Generator.zipf the domain is bounded and any
+    exponent >= 0 is allowed (0 is uniform).
+
+    Args:
+        n: Number of ranks
+        exponent: Zipf exponent (1.0 = standard Zipf)
+    """
+
+    def __init__(self, n, exponent=1.0):
+        """
+        Build the sampler.
+
+        Args:
+            n: Number of ranks
+            exponent: Zipf exponent
+        """
+        if exponent < 0:
+            raise ValueError("exponent must be non-negative")
+        super().__init__(zipf_weights(n, exponent))
+        self.exponent = exponent
+
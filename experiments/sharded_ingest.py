@@ -0,0 +1,227 @@
+"""
+Sharded Multi-Process Ingestion
+
+One sketch instance is bound to one core. A stream file is split into
+byte ranges, each worker process builds its own sketch from the items
+whose lines start in its range, and the shard sketches are merged
+pairwise (a merge tree of depth log2(shards)).
+
+Supported sketches are those whose merge() returns a new sketch equal to
+one fed both inputs: HyperLogLog, KMVSketch, ThetaSketch, LinearCounting
+and FlajoletMartin. With them the result equals single-process ingestion
+of the file with load_stream().
+"""
+
+import codecs
+import functools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sketches.hll import HyperLogLog
+from sketches.fm import FlajoletMartin
+from sketches.kmv import KMVSketch
+from sketches.linear_counting import LinearCounting
+from sketches.theta_sketch import ThetaSketch
+from experiments.convergence import load_stream
+
+
+BATCH_SIZE = 65536  # Items hashed per add_many() call in a worker
+READ_BLOCK_SIZE = 1 << 20  # Bytes decoded per block in a worker
+
+
+def shard_ranges(filepath, shards):
+    """
+    Split a file into contiguous byte ranges of near-equal size.
+
+    Returns:
+        List of (start, end) byte offsets covering the file
+    """
+    size = os.path.getsize(filepath)
+    bounds = np.linspace(0, size, shards + 1).astype(np.int64).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _line_start(f, pos):
+    """
+    Offset of the first line starting at or after byte pos.
+
+    Lines end at '\n', '\r' or '\r\n', like text-mode universal newlines.
+    """
+    if pos == 0:
+        return 0
+    offset = pos - 1
+    f.seek(offset)
+    while True:
+        block = f.read(READ_BLOCK_SIZE)
+        if not block:
+            return offset
+        found = [i for i in (block.find(b'\n'), block.find(b'\r')) if i >= 0]
+        if found:
+            i = min(found)
+            start = offset + i + 1
+            if block[i:i + 1] == b'\r':
+                f.seek(start)
+                if f.read(1) == b'\n':
+                    start += 1
+            return start
+        offset += len(block)
+
+
+def read_shard(filepath, start, end, batch_size=BATCH_SIZE):
+    """
+    Yield batches of the items whose line starts in bytes [start, end).
+
+    A line crossing a boundary belongs to the shard holding its first
+    byte, so the shards partition the stream exactly. Lines are split and
+    stripped as load_stream() does in text mode, and blank lines skipped.
+    """
+    with open(filepath, 'rb') as f:
+        lo = _line_start(f, start)
+        hi = _line_start(f, end)
+        f.seek(lo)
+        remaining = hi - lo
+
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        carry = ''
+        batch = []
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            # A '\r\n' split across blocks only adds a blank line, which is skipped
+            lines = (carry + decoder.decode(block, final=remaining == 0)).replace('\r', '\n').split('\n')
+            carry = lines.pop()
+            for line in lines:
+                item = line.strip()
+                if item:
+                    batch.append(item)
+                    if len(batch) == batch_size:
+                        yield batch
+                        batch = []
+
+        item = carry.strip()
+        if item:
+            batch.append(item)
+        if batch:
+            yield batch
+
+
+def _ingest_shard(task):
+    """Worker: build one sketch from a byte range and time it."""
+    filepath, start, end, sketch_factory, batch_size = task
+    start_time = time.time()
+    sketch = sketch_factory()
+    n = 0
+    for batch in read_shard(filepath, start, end, batch_size):
+        sketch.add_many(batch)
+        n += len(batch)
+    seconds = time.time() - start_time
+    return sketch, {
+        'start': start,
+        'end': end,
+        'items': n,
+        'seconds': seconds,
+        'items_per_second': n / seconds if seconds > 0 else float('inf')
+    }
+
+
+def tree_merge(sketches):
+    """Merge a non-empty list of sketches pairwise, level by level."""
+    while len(sketches) > 1:
+        merged = [a.merge(b) for a, b in zip(sketches[0::2], sketches[1::2])]
+        if len(sketches) % 2:
+            merged.append(sketches[-1])
+        sketches = merged
+    return sketches[0]
+
+
+def sharded_ingest(filepath, sketch_factory=HyperLogLog, shards=None, workers=None, batch_size=BATCH_SIZE):
+    """
+    Build one sketch of a stream file with several processes.
+
+    Args:
+        filepath: Path to the line-per-item stream file
+        sketch_factory: Picklable callable returning an empty mergeable
+                        sketch (a class or functools.partial)
+        shards: Number of byte ranges (default: workers)
+        workers: Worker processes (None: os.cpu_count(); 1 runs inline)
+        batch_size: Items per add_many() call
+
+    Returns:
+        Tuple of (merged sketch, stats) where stats has per-shard 'shards'
+        timings, 'merge_seconds' and 'total_seconds'
+    """
+    if shards is None:
+        shards = workers or os.cpu_count() or 1
+    start_time = time.time()
+    tasks = [(filepath, start, end, sketch_factory, batch_size) for start, end in shard_ranges(filepath, shards)]
+
+    if workers == 1:
+        results = [_ingest_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_ingest_shard, tasks))
+
+    merge_start = time.time()
+    sketch = tree_merge([result[0] for result in results])
+    end_time = time.time()
+
+    return sketch, {
+        'shards': [dict(result[1], shard=i) for i, result in enumerate(results)],
+        'merge_seconds': end_time - merge_start,
+        'total_seconds': end_time - start_time
+    }
+
+
+def main():
+    """Sharded vs single-process ingestion of each real dataset."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(script_dir), 'data')
+    datasets = {
+        'Wikipedia': 'wikipedia_items_chrono.txt',
+        'GitHub': 'github_items_chrono.txt',
+        'Enron': 'enron_items_chrono.txt',
+    }
+    sketches = {
+        'HLL': HyperLogLog,
+        'KMV': KMVSketch,
+        'Theta': ThetaSketch,
+        'LC': LinearCounting,
+        'FM': functools.partial(FlajoletMartin, num_hashes=64),
+    }
+    workers = os.cpu_count() or 1
+
+    print("=" * 80)
+    print(f"SHARDED INGESTION ({workers} workers)")
+    print("=" * 80)
+
+    for name, filename in datasets.items():
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            print(f"\n{name}: {filename} not found, skipping")
+            continue
+        items = load_stream(path)
+        print(f"\n{name}: {len(items):,} items")
+
+        for sketch_name, factory in sketches.items():
+            start_time = time.time()
+            single = factory()
+            single.add_many(items)
+            single_seconds = time.time() - start_time
+
+            sketch, stats = sharded_ingest(path, factory, workers=workers)
+            rates = [shard['items_per_second'] for shard in stats['shards']]
+            print(f"  {sketch_name:6s} single {single_seconds:6.2f}s  sharded {stats['total_seconds']:6.2f}s  "
+                  f"shard rate {min(rates):,.0f}-{max(rates):,.0f} items/s  "
+                  f"exact: {sketch.count() == single.count()}")
+
+
+if __name__ == "__main__":
+    main()
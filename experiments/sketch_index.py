@@ -0,0 +1,228 @@
+"""
+Segment-Tree Sketch Index
+
+Distinct count of any position range [a, b) of a stream file without
+replaying the stream. The stream is cut into blocks of block_size items;
+HyperLogLog registers (uint8) are stored for every block and for every
+aligned run of 2^l blocks, i.e. the nodes of a segment tree over the
+blocks. The registers of a range are the element-wise maximum of the
+O(log n) nodes that tile its whole blocks, plus the items of at most two
+partial blocks at its ends, read from the StreamStore. The result equals
+a HyperLogLog(p) fed exactly the items of [a, b).
+
+The index is saved beside the stream file (like the offset index) and
+memory-mapped, so a query only touches the rows it merges. Its size is
+about 2 * (n / block_size) * 2^p bytes.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sketches.hashing import hash64_many, bit_length
+from sketches.hll import HyperLogLog
+from sketches.multi_hll import estimate_registers
+from experiments.stream_store import StreamStore
+
+
+SKETCH_INDEX_SUFFIX = '.hll{p}.b{block_size}.npy'
+BUILD_BLOCKS = 16  # Blocks hashed per batch while building
+
+
+def level_sizes(num_blocks):
+    """Number of nodes at each segment-tree level, leaves first."""
+    sizes = [num_blocks]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+def build_sketch_index(store, p=10, block_size=4096, index_path=None):
+    """
+    Hash a stream once and save the segment tree of block registers.
+
+    Args:
+        store: StreamStore of the stream
+        p: HyperLogLog precision
+        block_size: Items per leaf block
+        index_path: Where to save the index (default: beside the stream file)
+
+    Returns:
+        Path of the saved index
+    """
+    if index_path is None:
+        index_path = store.filepath + SKETCH_INDEX_SUFFIX.format(p=p, block_size=block_size)
+
+    m = 1 << p
+    n = len(store)
+    num_blocks = -(-n // block_size)
+    leaves = np.zeros((num_blocks, m), dtype=np.uint8)
+    flat = leaves.reshape(-1)
+
+    step = block_size * BUILD_BLOCKS
+    for lo in range(0, n, step):
+        hi = min(lo + step, n)
+        hashes = hash64_many(store.read(np.arange(lo, hi)))
+        idx = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        w = hashes & np.uint64((1 << (64 - p)) - 1)
+        rho = ((64 - p) - bit_length(w) + 1).astype(np.uint8)
+        block = np.arange(lo, hi) // block_size
+        np.maximum.at(flat, block * m + idx, rho)
+
+    # Each level pairs up the nodes of the one below (odd tail padded with zeros)
+    levels = [leaves]
+    for size in level_sizes(num_blocks)[1:]:
+        below = levels[-1]
+        if len(below) % 2:
+            below = np.concatenate([below, np.zeros((1, m), dtype=np.uint8)])
+        levels.append(below.reshape(size, 2, m).max(axis=1))
+
+    np.save(index_path, np.concatenate(levels) if levels else leaves)
+    return index_path
+
+
+class SketchIndex:
+    """
+    Position-range distinct counts over a stream file.
+
+    The index is rebuilt automatically if it is missing, older than the
+    stream file, or does not match the stream length.
+
+    Args:
+        filepath: Path to the line-per-item stream file (or an open StreamStore)
+        p: HyperLogLog precision
+        block_size: Items per leaf block (range ends cost up to 2 * block_size hashes)
+        index_path: Path of the sketch index (default: beside the stream file)
+    """
+
+    def __init__(self, filepath, p=10, block_size=4096, index_path=None):
+        """
+        Open the stream and its sketch index, building the index if needed.
+
+        Args:
+            filepath: Stream file path or StreamStore
+            p: Precision (number of index bits)
+            block_size: Leaf block size in items
+            index_path: Optional explicit index location
+        """
+        if block_size <= 0:
+            raise ValueError("block_size must be positive")
+
+        self.store = filepath if isinstance(filepath, StreamStore) else StreamStore(filepath)
+        self.p = p
+        self.m = 1 << p
+        self.block_size = block_size
+        self.alpha = HyperLogLog(p).alpha
+        self.index_path = index_path or self.store.filepath + SKETCH_INDEX_SUFFIX.format(
+            p=p, block_size=block_size)
+
+        self.num_blocks = -(-len(self.store) // block_size)
+        sizes = level_sizes(self.num_blocks)
+        self.level_starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+
+        if (not os.path.exists(self.index_path)
+                or os.path.getmtime(self.index_path) < os.path.getmtime(self.store.filepath)):
+            build_sketch_index(self.store, p, block_size, self.index_path)
+        self.nodes = np.load(self.index_path, mmap_mode='r')
+        if self.nodes.shape != (sum(sizes), self.m):
+            build_sketch_index(self.store, p, block_size, self.index_path)
+            self.nodes = np.load(self.index_path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.store)
+
+    def _scan(self, registers, lo, hi):
+        """Scatter-max the items [lo, hi) into registers."""
+        if lo >= hi:
+            return
+        hashes = hash64_many(self.store.read(np.arange(lo, hi)))
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        w = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rho = ((64 - self.p) - bit_length(w) + 1).astype(np.uint8)
+        np.maximum.at(registers, idx, rho)
+
+    def decompose(self, first, last):
+        """
+        Segment-tree nodes that exactly tile blocks [first, last).
+
+        Returns:
+            int64 array of row numbers in the index
+        """
+        rows = []
+        level = 0
+        while first < last:
+            if first % 2:
+                rows.append(self.level_starts[level] + first)
+                first += 1
+            if last % 2:
+                last -= 1
+                rows.append(self.level_starts[level] + last)
+            first //= 2
+            last //= 2
+            level += 1
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def registers(self, start=0, stop=None):
+        """
+        HyperLogLog registers of the items at positions [start, stop).
+
+        Args:
+            start: First position (0-based)
+            stop: End position, exclusive (default: end of stream)
+
+        Returns:
+            uint8 array of 2^p registers
+        """
+        n = len(self.store)
+        if stop is None:
+            stop = n
+        if not 0 <= start <= stop <= n:
+            raise ValueError(f"range [{start}, {stop}) outside stream of {n} items")
+
+        registers = np.zeros(self.m, dtype=np.uint8)
+        first = -(-start // self.block_size)
+        last = stop // self.block_size
+        if first >= last:
+            self._scan(registers, start, stop)
+            return registers
+
+        rows = self.decompose(first, last)
+        np.maximum(registers, self.nodes[rows].max(axis=0), out=registers)
+        self._scan(registers, start, first * self.block_size)
+        self._scan(registers, last * self.block_size, stop)
+        return registers
+
+    def count(self, start=0, stop=None):
+        """Estimated distinct items at positions [start, stop)."""
+        return float(estimate_registers(self.registers(start, stop), self.alpha))
+
+    def prefix_counts(self, positions):
+        """
+        Estimates after the first i items for each checkpoint i.
+
+        Args:
+            positions: 1-based checkpoint positions (e.g. make_schedule output)
+
+        Returns:
+            List of estimates, equal to a HyperLogLog trace at those positions
+        """
+        return [self.count(0, int(i)) for i in positions]
+
+    def get_sketch(self, start=0, stop=None):
+        """Return the range [start, stop) as a standalone HyperLogLog."""
+        hll = HyperLogLog(self.p)
+        hll.registers = self.registers(start, stop).astype(np.int64).tolist()
+        return hll
+
+    def close(self):
+        """Release the stream's memory maps."""
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
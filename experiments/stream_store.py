@@ -0,0 +1,214 @@
+"""
+Offset-Indexed Stream Store
+
+Random access to line-per-item stream files (data/*_items_*.txt) without
+loading them into a Python list. Line start offsets are computed once,
+saved beside the stream file, and memory-mapped together with the file
+itself, so any ordering of the stream can be replayed in O(1) memory.
+"""
+
+import mmap
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from experiments.permutation import FeistelPermutation
+
+
+INDEX_SUFFIX = '.idx.npy'
+READ_BLOCK_SIZE = 1 << 22  # Bytes scanned per block when building the index
+
+# Bytes str.strip() removes (its ASCII whitespace)
+ASCII_WHITESPACE = np.zeros(256, dtype=bool)
+ASCII_WHITESPACE[list(b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f')] = True
+
+
+def _item_offsets(chunk, base):
+    """
+    [start, end) of the stripped, non-blank lines of a chunk of whole lines.
+
+    Lines end at '\n', '\r' or '\r\n' (text-mode universal newlines); the
+    empty line a '\r\n' pair produces here is blank and dropped anyway.
+    """
+    buf = np.frombuffer(chunk, dtype=np.uint8)
+    breaks = np.flatnonzero((buf == ord('\n')) | (buf == ord('\r')))
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(buf)]))
+
+    # Trim ASCII whitespace: first and last non-whitespace byte of each line
+    solid = np.flatnonzero(~ASCII_WHITESPACE[buf])
+    if solid.size == 0:
+        return np.empty((0, 2), dtype=np.uint64)
+    first_at = np.searchsorted(solid, starts)
+    keep = first_at < solid.size
+    first = solid[np.minimum(first_at, solid.size - 1)]
+    keep &= first < ends
+    last = solid[np.maximum(np.searchsorted(solid, ends) - 1, 0)]
+    starts = first[keep].astype(np.int64)
+    ends = last[keep].astype(np.int64) + 1
+
+    # str.strip() also removes non-ASCII whitespace (e.g. U+00A0), which can
+    # only sit at a line edge that is a non-ASCII byte
+    edge = np.flatnonzero((buf[starts] >= 0x80) | (buf[ends - 1] >= 0x80))
+    if edge.size:
+        drop = []
+        for i in edge.tolist():
+            text = chunk[starts[i]:ends[i]].decode('utf-8')
+            item = text.strip()
+            if not item:
+                drop.append(i)
+                continue
+            lead = len(text[:len(text) - len(text.lstrip())].encode('utf-8'))
+            trail = len(text[len(text.rstrip()):].encode('utf-8'))
+            starts[i] += lead
+            ends[i] -= trail
+        if drop:
+            keep = np.ones(len(starts), dtype=bool)
+            keep[drop] = False
+            starts, ends = starts[keep], ends[keep]
+
+    return np.stack([starts + base, ends + base], axis=1).astype(np.uint64)
+
+
+def build_offset_index(filepath, index_path=None):
+    """
+    Scan a stream file once and record where every item starts and ends.
+
+    Items match load_stream(): lines are split like text mode ('\n',
+    '\r', '\r\n'), stripped of whitespace, and blank lines skipped.
+
+    Args:
+        filepath: Path to the line-per-item stream file
+        index_path: Where to save the index (default: filepath + '.idx.npy')
+
+    Returns:
+        Path of the saved index
+    """
+    if index_path is None:
+        index_path = filepath + INDEX_SUFFIX
+
+    offsets = []
+    base = 0
+    carry = b''
+    with open(filepath, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            data = carry + block
+            if block:
+                # Only whole lines are indexed; the tail waits for the next block
+                cut = max(data.rfind(b'\n'), data.rfind(b'\r')) + 1
+                data, carry = data[:cut], data[cut:]
+            if data:
+                offsets.append(_item_offsets(data, base))
+                base += len(data)
+            if not block:
+                break
+
+    # Row i holds [start, end) of item i
+    offsets = np.concatenate(offsets) if offsets else np.empty((0, 2), dtype=np.uint64)
+    np.save(index_path, offsets)
+    return index_path
+
+
+class StreamStore:
+    """
+    Memory-mapped, offset-indexed view of a stream file.
+
+    Items are decoded lazily, so memory use does not grow with the stream.
+    The offset index is rebuilt automatically if it is missing or older
+    than the stream file.
+
+    Args:
+        filepath: Path to the line-per-item stream file
+        index_path: Path of the offset index (default: filepath + '.idx.npy')
+    """
+
+    def __init__(self, filepath, index_path=None):
+        """
+        Open the stream file and its offset index.
+
+        Args:
+            filepath: Path to the stream file
+            index_path: Optional explicit index location
+        """
+        self.filepath = filepath
+        self.index_path = index_path or filepath + INDEX_SUFFIX
+
+        if (not os.path.exists(self.index_path)
+                or os.path.getmtime(self.index_path) < os.path.getmtime(filepath)):
+            build_offset_index(filepath, self.index_path)
+
+        self.offsets = np.load(self.index_path, mmap_mode='r')
+        self._file = open(filepath, 'rb')
+        if os.path.getsize(filepath) > 0:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = b''
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        """Return item i as a string."""
+        start, end = self.offsets[i]
+        return self._data[int(start):int(end)].decode('utf-8')
+
+    def read(self, positions):
+        """
+        Fetch the items at the given positions.
+
+        Args:
+            positions: Iterable of item indices
+
+        Returns:
+            List of items in the order requested
+        """
+        data = self._data
+        rows = self.offsets[np.asarray(positions, dtype=np.int64)].tolist()
+        return [data[start:end].decode('utf-8') for start, end in rows]
+
+    def iter_range(self, start=0, stop=None, chunk_size=65536):
+        """Yield items [start, stop) in stream order."""
+        if stop is None:
+            stop = len(self)
+        for lo in range(start, stop, chunk_size):
+            yield from self.read(np.arange(lo, min(lo + chunk_size, stop)))
+
+    def iter_permuted(self, permutation, chunk_size=65536):
+        """
+        Yield items in the order given by a permutation.
+
+        Args:
+            permutation: FeistelPermutation over len(self), or any index array
+            chunk_size: Number of positions resolved per batch
+
+        Yields:
+            Items, where the i-th item yielded is self[permutation[i]]
+        """
+        n = len(permutation)
+        for lo in range(0, n, chunk_size):
+            hi = min(lo + chunk_size, n)
+            if isinstance(permutation, FeistelPermutation):
+                idx = permutation.indices(lo, hi)
+            else:
+                idx = permutation[lo:hi]
+            yield from self.read(idx)
+
+    def iter_random(self, seed=0, chunk_size=65536):
+        """Yield the whole stream in a reproducible pseudo-random order."""
+        return self.iter_permuted(FeistelPermutation(len(self), seed=seed), chunk_size)
+
+    def close(self):
+        """Release the memory maps."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -10,9 +10,13 @@ import os
 import json
 import random
 
+import numpy as np
+
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from experiments.convergence import run_with_trace, compute_convergence_metrics
+from experiments.convergence import make_sketch, run_hashed_trace, compute_convergence_metrics
+from experiments.orderings import grouped_order, random_order
+from experiments.sweep import run_sweep
 
 
 def generate_correlated_stream_with_fraction(n_elements, hot_fraction, hot_set_size=100, cold_set_size=50000):
@@ -47,9 +51,13 @@ def generate_correlated_stream_with_fraction(n_elements, hot_fraction, hot_set_s
     return stream
 
 
-def run_correlation_sweep():
+def run_correlation_sweep(schedule='linear', budget=None):
     """
     Test order sensitivity across different correlation levels.
+    
+    Args:
+        schedule: Checkpoint schedule for the traces ('linear', 'log', 'hybrid')
+        budget: Checkpoints per trace (None keeps step=1000 for 'linear')
     """
     
     print("\n" + "="*80)
@@ -68,29 +76,54 @@ def run_correlation_sweep():
     print(f"{'Hot Fraction':<15} {'Grouped':<15} {'Random':<15} {'Sensitivity':<15} {'Unique Items':<15}")
     print("-" * 80)
     
-    for hot_frac in hot_fractions:
+    # Every hot fraction draws from the same hot/cold vocabulary, so it is
+    # hashed once for the whole sweep and each ordering is an ID array
+    vocab = sorted([f"hot_{i}" for i in range(100)] + [f"cold_{i}" for i in range(50000)])
+    index = {item: i for i, item in enumerate(vocab)}
+    
+    def vocab_hashes(params, context):
+        return make_sketch('hll').hash_items(vocab)
+    
+    def orderings(params, context):
         # Generate stream with this correlation
         random.seed(42)
         stream = generate_correlated_stream_with_fraction(
             n_elements=100000,
-            hot_fraction=hot_frac,
+            hot_fraction=params['hot_fraction'],
             hot_set_size=100,
             cold_set_size=50000
         )
+        ids = np.fromiter(map(index.__getitem__, stream), dtype=np.int64, count=len(stream))
         
-        unique_count = len(set(stream))
-        
-        # Grouped order (best case)
-        grouped_stream = sorted(stream)
-        traces = run_with_trace(grouped_stream, 'hll', step=1000)
-        metrics_grouped = compute_convergence_metrics(traces, unique_count)
-        grouped_time = metrics_grouped['time_to_5_percent']
+        # Grouped order (best case): sorting IDs sorts the items
+        grouped_ids = ids[grouped_order(ids)]
         
         # Random order (worst case)
-        random_stream = stream.copy()
-        random.shuffle(random_stream)
-        traces = run_with_trace(random_stream, 'hll', step=1000)
-        metrics_random = compute_convergence_metrics(traces, unique_count)
+        random_ids = ids[random_order(len(ids), seed=42)]
+        
+        return {'grouped': grouped_ids, 'random': random_ids, 'unique': len(np.unique(ids))}
+    
+    def trace_metrics(order):
+        def stage(params, context):
+            streams = context['orderings']
+            traces = run_hashed_trace(streams[order], context['vocab_hashes'], 'hll', step=1000,
+                                      schedule=schedule, budget=budget)
+            return compute_convergence_metrics(traces, streams['unique'])
+        return stage
+    
+    stages = {
+        'vocab_hashes': (vocab_hashes, ()),
+        'orderings': (orderings, ('hot_fraction',)),
+        'grouped': (trace_metrics('grouped'), ('hot_fraction',)),
+        'random': (trace_metrics('random'), ('hot_fraction',)),
+    }
+    
+    for params, (context,) in run_sweep({'hot_fraction': hot_fractions}, stages):
+        hot_frac = params['hot_fraction']
+        unique_count = context['orderings']['unique']
+        metrics_grouped = context['grouped']
+        metrics_random = context['random']
+        grouped_time = metrics_grouped['time_to_5_percent']
         random_time = metrics_random['time_to_5_percent']
         
         # Compute sensitivity
@@ -17,10 +17,13 @@ import math
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
+
 # Import Theta Sketch implementation
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from sketches.theta_sketch import ThetaSketch
+from experiments.checkpoints import make_schedule, run_schedule
 
 
 def load_stream_from_file(filepath, limit=None):
@@ -43,7 +46,7 @@ def load_stream_from_file(filepath, limit=None):
     return items
 
 
-def analyze_convergence(items, dataset_name, ordering_name, k=4096):
+def analyze_convergence(items, dataset_name, ordering_name, k=4096, schedule='linear', budget=20):
     """
     Run convergence test with Theta Sketch.
     
@@ -52,42 +55,80 @@ def analyze_convergence(items, dataset_name, ordering_name, k=4096):
         dataset_name: Name of dataset
         ordering_name: Type of ordering (grouped/random/chrono)
         k: Sketch size parameter
+        schedule: Checkpoint schedule ('linear', 'log' or 'hybrid')
+        budget: Number of checkpoints
     
     Returns:
         Dictionary with convergence results
     """
     sketch = ThetaSketch(k=k)
-    convergence = []
-    checkpoint_interval = max(1, len(items) // 20)  # 20 checkpoints
+    
+    # Estimate only at the checkpoints; items in between go in as one batch
+    positions = make_schedule(len(items), schedule, budget)
+    estimates = run_schedule(sketch, items, positions, estimator=ThetaSketch.cardinality)
+    
+    return _convergence_result(items, dataset_name, ordering_name, positions, estimates, k)
+
+
+def analyze_convergence_nested(items, dataset_name, ordering_name, ks=(256, 512, 1024, 2048, 4096),
+                               schedule='linear', budget=20):
+    """
+    Convergence test for several k values from one Theta Sketch pass.
+    
+    Only a sketch with the largest k is fed; estimate_at_k() reads the
+    estimate every smaller sketch would give at each checkpoint, so the
+    results equal one analyze_convergence() run per k.
+    
+    Args:
+        items: Stream of items
+        dataset_name: Name of dataset
+        ordering_name: Type of ordering (grouped/random/chrono)
+        ks: Sketch sizes to report
+        schedule: Checkpoint schedule ('linear', 'log' or 'hybrid')
+        budget: Number of checkpoints
+    
+    Returns:
+        List of convergence result dictionaries, one per k
+    """
+    ks = sorted(ks)
+    sketch = ThetaSketch(k=ks[-1])
+    
+    positions = make_schedule(len(items), schedule, budget)
+    estimates = run_schedule(sketch, items, positions, estimator=lambda s: s.estimate_at_k(ks))
     
     true_unique = len(set(items))
+    return [
+        _convergence_result(items, dataset_name, ordering_name, positions, estimates[:, j], k, true_unique)
+        for j, k in enumerate(ks)
+    ]
+
+
+def _convergence_result(items, dataset_name, ordering_name, positions, estimates, k, true_unique=None):
+    """Build the convergence result dictionary from checkpoint estimates."""
+    convergence = []
+    
+    if true_unique is None:
+        true_unique = len(set(items))
     time_to_5pct = len(items)
     final_error = 0
     
-    for i, item in enumerate(items):
-        sketch.add(item)
-        
-        # Check at intervals
-        if (i + 1) % checkpoint_interval == 0 or i == len(items) - 1:
-            estimate = sketch.cardinality()
-            if estimate < 1:
-                estimate = 1
-            
-            error = abs(estimate - true_unique) / true_unique * 100
-            pct = 100 * (i + 1) / len(items)
-            
-            convergence.append({
-                'items': i + 1,
-                'pct': round(pct, 1),
-                'estimate': round(estimate),
-                'error': round(error, 2)
-            })
-            
-            # Track time to 5% error
-            if error <= 5.0 and time_to_5pct == len(items):
-                time_to_5pct = i + 1
-            
-            final_error = error
+    estimates = np.maximum(estimates, 1)
+    errors = np.abs(estimates - true_unique) / true_unique * 100
+    
+    for position, estimate, error in zip(positions.tolist(), estimates.tolist(), errors.tolist()):
+        convergence.append({
+            'items': position,
+            'pct': round(100 * position / len(items), 1),
+            'estimate': round(estimate),
+            'error': round(error, 2)
+        })
+    
+    # Track time to 5% error
+    within = np.flatnonzero(errors <= 5.0)
+    if within.size:
+        time_to_5pct = int(positions[within[0]])
+    if errors.size:
+        final_error = float(errors[-1])
     
     return {
         'dataset': dataset_name,
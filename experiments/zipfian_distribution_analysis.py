@@ -9,12 +9,13 @@ This supplements the main experiments with realistic distribution analysis.
 import sys
 import os
 import json
-import random
 from collections import Counter
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from experiments.convergence import run_with_trace, compute_convergence_metrics
+from experiments.orderings import encode_ids, apply_order, grouped_order, random_order
+from experiments.samplers import DiscreteSampler, ZipfSampler
 
 
 def extract_domains(urls):
@@ -32,14 +33,21 @@ def extract_domains(urls):
     return domains
 
 
-def create_zipfian_stream(domains, stream_size=100000, zipf_exponent=1.0):
+def create_zipfian_stream(domains, stream_size=100000, zipf_exponent=1.0, empirical=False, seed=None):
     """
     Create stream following Zipfian distribution based on observed domain frequencies.
     
+    Domains are ranked by observed frequency and ranks are drawn from a
+    finite Zipf distribution, P(rank k) ~ 1/k^alpha, by inverse-CDF
+    sampling; with empirical=True ranks follow the observed frequencies
+    instead.
+    
     Args:
         domains: List of domains from real data
         stream_size: Target stream size
         zipf_exponent: Zipf exponent (1.0 = standard Zipf)
+        empirical: Sample the observed domain frequencies instead of Zipf
+        seed: Seed or np.random.Generator
     
     Returns:
         Stream of domains following Zipfian distribution
@@ -49,25 +57,26 @@ def create_zipfian_stream(domains, stream_size=100000, zipf_exponent=1.0):
     domain_counts = Counter(domains)
     sorted_domains = sorted(domain_counts.items(), key=lambda x: x[1], reverse=True)
     
-    # Generate Zipfian weights
-    unique_domains = len(sorted_domains)
-    stream = []
+    # Draw all ranks in one vectorized call
+    if empirical:
+        sampler = DiscreteSampler([count for _, count in sorted_domains])
+    else:
+        sampler = ZipfSampler(len(sorted_domains), zipf_exponent)
+    ranks = sampler.sample(stream_size, seed)
     
-    for pos in range(stream_size):
-        # Zipfian distribution: P(rank k) ~ 1/(k^alpha)
-        # Use rejection sampling to pick according to Zipfian
-        rank = int((random.random() ** (-1 / zipf_exponent)) % unique_domains)
-        rank = min(rank, unique_domains - 1)
-        
-        domain = sorted_domains[rank][0]
-        stream.append(domain)
+    names = [domain for domain, _ in sorted_domains]
+    stream = [names[rank] for rank in ranks.tolist()]
     
     return stream, sorted_domains
 
 
-def run_zipfian_analysis():
+def run_zipfian_analysis(schedule='linear', budget=None):
     """
     Test order sensitivity on Zipfian-distributed domain data.
+    
+    Args:
+        schedule: Checkpoint schedule for the traces ('linear', 'log', 'hybrid')
+        budget: Checkpoints per trace (None keeps step=1000 for 'linear')
     """
     
     print("\n" + "="*80)
@@ -128,16 +137,15 @@ def run_zipfian_analysis():
     print("-" * 80)
     
     # Grouped (sorted domains)
-    grouped_stream = sorted(stream)
-    traces = run_with_trace(grouped_stream, 'hll', step=1000)
+    ids, _ = encode_ids(stream)
+    grouped_stream = apply_order(stream, grouped_order(ids))
+    traces = run_with_trace(grouped_stream, 'hll', step=1000, schedule=schedule, budget=budget)
     metrics_grouped = compute_convergence_metrics(traces, true_count)
     grouped_time = metrics_grouped['time_to_5_percent'] or 100000
     
     # Random order
-    random_stream = stream.copy()
-    random.seed(42)
-    random.shuffle(random_stream)
-    traces = run_with_trace(random_stream, 'hll', step=1000)
+    random_stream = apply_order(stream, random_order(len(stream), seed=42))
+    traces = run_with_trace(random_stream, 'hll', step=1000, schedule=schedule, budget=budget)
     metrics_random = compute_convergence_metrics(traces, true_count)
     random_time = metrics_random['time_to_5_percent'] or 100000
     
@@ -1,6 +1,10 @@
 import mmh3
 import math
 
+import numpy as np
+
+from sketches.hashing import nonempty_runs
+
 class FlajoletMartin:
     """
     Flajolet-Martin (FM) distinct count sketch.
@@ -20,6 +24,28 @@ class FlajoletMartin:
         self.max_zero = [0] * num_hashes
         self.num_hashes = num_hashes
     
+    def hash_item(self, item):
+        """The num_hashes seeded 32-bit hashes of an item, as used by add()."""
+        item_str = str(item)
+        return [mmh3.hash(item_str, seed=i, signed=False) for i in range(self.num_hashes)]
+    
+    def hash_items(self, items):
+        """
+        Hash a batch of items (see add_hashes).
+        
+        Returns:
+            uint32 array of shape (len(items), num_hashes)
+        """
+        item_strs = [str(item) for item in items]
+        hashes = np.empty((len(item_strs), self.num_hashes), dtype=np.uint32)
+        for i in range(self.num_hashes):
+            hashes[:, i] = np.fromiter(
+                (mmh3.hash(s, seed=i, signed=False) for s in item_strs),
+                dtype=np.uint32,
+                count=len(item_strs),
+            )
+        return hashes
+    
     def add(self, item):
         """
         Add an item to the sketch.
@@ -27,12 +53,7 @@ class FlajoletMartin:
         Args:
             item: Hashable object (typically string)
         """
-        item_str = str(item)
-        
-        for i in range(self.num_hashes):
-            # Create independent hash functions using different seeds
-            h = mmh3.hash(item_str, seed=i, signed=False)
-            
+        for i, h in enumerate(self.hash_item(item)):
             if h == 0:
                 # Special case: hash is 0, so leading zero count is infinite
                 trailing = 33
@@ -44,6 +65,42 @@ class FlajoletMartin:
             # Update maximum position of first 1 bit
             self.max_zero[i] = max(self.max_zero[i], trailing)
     
+    def add_hashes(self, hashes, counts=None):
+        """
+        Add a batch of pre-hashed items (vectorized equivalent of add()).
+        
+        Args:
+            hashes: Array of shape (n, num_hashes) from hash_items()
+            counts: Multiplicity of each hash (accepted for interface
+                    compatibility; repeats never change the maxima)
+        """
+        hashes = np.asarray(hashes, dtype=np.int64).reshape(-1, self.num_hashes)
+        if hashes.shape[0] == 0:
+            return
+        
+        # Isolate the lowest set bit; its exponent is the trailing zero count
+        trailing = np.frexp((hashes & -hashes).astype(np.float64))[1] - 1
+        trailing[hashes == 0] = 33
+        self.max_zero = np.maximum(self.max_zero, trailing.max(axis=0)).tolist()
+    
+    def add_many(self, items):
+        """Add a batch of items through the vectorized path."""
+        self.add_hashes(self.hash_items(items))
+    
+    def add_run(self, item, count=1):
+        """
+        Add a run of `count` identical items, hashing and applying it once.
+        
+        Repeats never change the maxima, so this is add() when count > 0.
+        """
+        if count > 0:
+            self.add(item)
+    
+    def add_runs(self, items, counts):
+        """Add a batch of runs (run-length encoded stream) through the vectorized path."""
+        items, counts = nonempty_runs(items, counts)
+        self.add_hashes(self.hash_items(items), counts)
+    
     def count(self):
         """
         Estimate the number of distinct elements.
@@ -70,6 +127,49 @@ class FlajoletMartin:
         correction_factor = 0.77351
         return avg_estimate * correction_factor
     
+    def merge(self, other):
+        """
+        Merge another FlajoletMartin sketch into a new sketch.
+        
+        Each hash function keeps its maximum, so the result equals one
+        sketch fed both streams.
+        
+        Args:
+            other: Another FlajoletMartin instance (same num_hashes)
+        
+        Returns:
+            New merged FlajoletMartin
+        """
+        if not isinstance(other, FlajoletMartin):
+            raise TypeError("Can only merge with another FlajoletMartin")
+        
+        if self.num_hashes != other.num_hashes:
+            raise ValueError(f"Cannot merge sketches with different num_hashes: {self.num_hashes} vs {other.num_hashes}")
+        
+        merged = FlajoletMartin(num_hashes=self.num_hashes)
+        merged.max_zero = np.maximum(self.max_zero, other.max_zero).tolist()
+        return merged
+    
     def get_max_zeros(self):
         """Return current state of max zero positions (for debugging)."""
         return self.max_zero[:]
+    
+    def to_bytes(self):
+        """
+        Compact serialization: one byte per hash function (its max zero count).
+        
+        Returns:
+            bytes of length num_hashes (see from_bytes)
+        """
+        return np.asarray(self.max_zero, dtype=np.uint8).tobytes()
+    
+    def serialized_size(self):
+        """Length of to_bytes(), without serializing."""
+        return self.num_hashes
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a sketch serialized with to_bytes()."""
+        fm = cls(num_hashes=len(data))
+        fm.max_zero = np.frombuffer(data, dtype=np.uint8).astype(np.int64).tolist()
+        return fm
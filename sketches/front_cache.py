@@ -0,0 +1,157 @@
+"""
+Duplicate-Suppression Front Cache
+
+Small direct-mapped cache of recently seen items placed in front of any
+sketch. On chronological and grouped streams the same key tends to
+arrive again within a short window; an exact repeat found in the cache
+is dropped before it pays for str(), MurmurHash and a sketch update.
+Dropping repeats never changes the state of a whole-stream distinct-count
+sketch. It does change a sliding-window sketch (SlidingHyperLogLog):
+a dropped repeat no longer refreshes the item's last-seen position, so
+never put the cache in front of one.
+"""
+
+
+_EMPTY = object()  # Marks an empty slot; never matches an item
+
+
+def _matches(cached, item):
+    """
+    Whether item is a repeat of the cached item for every sketch.
+
+    Sketches hash str(item), so 1 and 1.0 (or 0.0 and -0.0) are different
+    items even though they compare equal; strings need only ==.
+    """
+    if type(cached) is not type(item):
+        return False
+    if type(item) is str:
+        return cached == item
+    return cached == item and str(cached) == str(item)
+
+
+class FrontCache:
+    """
+    Direct-mapped recent-items cache wrapping a sketch.
+
+    Each item maps to one slot via Python's built-in hash() (cached on str
+    objects, so much cheaper than mmh3). If the slot already holds the same
+    item (same type and str() form) the add is a hit and is dropped;
+    otherwise the item replaces the slot's occupant and is forwarded to
+    the sketch.
+
+    Sketches that also count raw items (KMVSketch.n) only see forwarded
+    items; items_seen keeps the raw total.
+
+    Args:
+        sketch: Any object with add() and count() (sketch or buffered sketch)
+        size: Number of cache slots (rounded up to a power of 2)
+    """
+
+    def __init__(self, sketch, size=1024):
+        """
+        Initialize front cache.
+
+        Args:
+            sketch: Sketch to forward cache misses to
+            size: Number of slots
+        """
+        if size <= 0:
+            raise ValueError("size must be positive")
+
+        self.sketch = sketch
+        self.size = 1 << (size - 1).bit_length()
+        self._mask = self.size - 1
+        self._slots = [_EMPTY] * self.size
+
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, item):
+        """Forward item to the sketch unless it is a cached repeat."""
+        slot = hash(item) & self._mask
+        if _matches(self._slots[slot], item):
+            self.hits += 1
+            return
+        self._slots[slot] = item
+        self.misses += 1
+        self.sketch.add(item)
+
+    def add_many(self, items):
+        """Filter a batch through the cache and forward the misses in one batch."""
+        slots = self._slots
+        mask = self._mask
+        misses = []
+        for item in items:
+            slot = hash(item) & mask
+            if not _matches(slots[slot], item):
+                slots[slot] = item
+                misses.append(item)
+
+        self.hits += len(items) - len(misses)
+        self.misses += len(misses)
+        if misses:
+            self.sketch.add_many(misses)
+
+    def add_run(self, item, count=1):
+        """Forward a run of identical items unless the item is a cached repeat."""
+        if count <= 0:
+            return
+        slot = hash(item) & self._mask
+        if _matches(self._slots[slot], item):
+            self.hits += count
+            return
+        self._slots[slot] = item
+        self.misses += 1
+        self.hits += count - 1
+        self.sketch.add_run(item, count)
+
+    def add_runs(self, items, counts):
+        """Filter a batch of runs through the cache and forward the misses in one batch."""
+        slots = self._slots
+        mask = self._mask
+        miss_items = []
+        miss_counts = []
+        for item, count in zip(items, counts):
+            if count <= 0:
+                continue
+            slot = hash(item) & mask
+            if not _matches(slots[slot], item):
+                slots[slot] = item
+                miss_items.append(item)
+                miss_counts.append(count)
+
+        total = int(sum(c for c in counts if c > 0))
+        self.misses += len(miss_items)
+        self.hits += total - len(miss_items)
+        if miss_items:
+            self.sketch.add_runs(miss_items, miss_counts)
+
+    def count(self):
+        """Cardinality estimate of the wrapped sketch."""
+        return self.sketch.count()
+
+    @property
+    def items_seen(self):
+        """Total items offered to the cache (hits + misses)."""
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self):
+        """Fraction of items dropped as cached repeats."""
+        seen = self.items_seen
+        return self.hits / seen if seen else 0.0
+
+    def clear(self):
+        """Empty the cache and reset the counters (the sketch is untouched)."""
+        self._slots = [_EMPTY] * self.size
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        """Return cache statistics."""
+        return {
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate
+        }
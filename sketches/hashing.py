@@ -0,0 +1,84 @@
+"""
+Vectorized hashing helpers shared by the sketch batch paths.
+
+mmh3 hashes one item per call, so hashing itself stays a Python-level
+loop; everything after it (register indexing, rho, minima) runs in NumPy.
+"""
+
+from itertools import chain
+
+import mmh3
+import numpy as np
+
+
+def hash64_many(items):
+    """
+    Hash items with the same 64-bit MurmurHash used by HyperLogLog.add.
+
+    Args:
+        items: Sequence of hashable objects (converted with str())
+
+    Returns:
+        uint64 array of hashes, one per item
+    """
+    return np.fromiter(
+        (mmh3.hash64(str(item), signed=False)[0] for item in items),
+        dtype=np.uint64,
+        count=len(items),
+    )
+
+
+def hash128_many(items):
+    """
+    Both 64-bit halves of MurmurHash3 x64_128 for each item.
+
+    Column 0 is the hash64_many() value; column 1 is the second half.
+
+    Returns:
+        uint64 array shaped (len(items), 2)
+    """
+    halves = chain.from_iterable(mmh3.hash64(str(item), signed=False) for item in items)
+    return np.fromiter(halves, dtype=np.uint64, count=2 * len(items)).reshape(-1, 2)
+
+
+def mix64(values):
+    """SplitMix64 finalizer applied element-wise to a uint64 array."""
+    z = np.asarray(values, dtype=np.uint64)
+    z = z ^ (z >> np.uint64(30))
+    z = z * np.uint64(0xBF58476D1CE4E5B9)
+    z = z ^ (z >> np.uint64(27))
+    z = z * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def bit_length(values):
+    """
+    Exact int.bit_length() for every element of a uint64 array.
+
+    Each 32-bit half is converted to float64 separately so frexp() never
+    sees a rounded value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    hi = (values >> np.uint64(32)).astype(np.float64)
+    lo = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, np.frexp(hi)[1] + 32, np.frexp(lo)[1]).astype(np.int64)
+
+
+def nonempty_runs(items, counts):
+    """
+    Drop runs with a non-positive count.
+
+    Args:
+        items: Sequence of run items
+        counts: Run lengths, one per item
+
+    Returns:
+        Tuple of (items, counts) with counts as an int64 array
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    if len(items) != len(counts):
+        raise ValueError("items and counts must have the same length")
+    keep = counts > 0
+    if keep.all():
+        return items, counts
+    return [item for item, k in zip(items, keep.tolist()) if k], counts[keep]
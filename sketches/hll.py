@@ -1,6 +1,27 @@
 import mmh3
 import math
 
+import numpy as np
+
+from sketches.hashing import hash64_many, bit_length, nonempty_runs
+
+def fold_registers(registers, p, p_target):
+    """
+    Fold a precision-p register array to precision p_target (see HyperLogLog.fold).
+    
+    Returns:
+        int64 array of 2^p_target registers
+    """
+    registers = np.asarray(registers, dtype=np.int64)
+    d = p - p_target
+    if d == 0:
+        return registers.copy()
+    
+    dropped = np.arange(1 << p, dtype=np.uint64) & np.uint64((1 << d) - 1)
+    rho = np.where(dropped != 0, d - bit_length(dropped) + 1, d + registers)
+    rho[registers == 0] = 0
+    return rho.reshape(1 << p_target, 1 << d).max(axis=1)
+
 class HyperLogLog:
     def __init__(self, p=10):
         """
@@ -34,6 +55,14 @@ class HyperLogLog:
         # Count leading zero bits
         return (64 - self.p) - w.bit_length() + 1
     
+    def hash_item(self, item):
+        """64-bit MurmurHash of an item, as used by add()."""
+        return mmh3.hash64(str(item), signed=False)[0]
+    
+    def hash_items(self, items):
+        """Hash a batch of items into a uint64 array (see add_hashes)."""
+        return hash64_many(items)
+    
     def add(self, item):
         """
         Add an item to the sketch.
@@ -42,7 +71,7 @@ class HyperLogLog:
             item: Hashable object (typically string)
         """
         # Hash the item using MurmurHash
-        h = mmh3.hash64(str(item), signed=False)[0]
+        h = self.hash_item(item)
         
         # Extract register index from first p bits
         idx = h >> (64 - self.p)
@@ -54,6 +83,45 @@ class HyperLogLog:
         rho = self._leading_zero_count(w)
         self.registers[idx] = max(self.registers[idx], rho)
     
+    def add_hashes(self, hashes, counts=None):
+        """
+        Add a batch of pre-hashed items (vectorized equivalent of add()).
+        
+        Args:
+            hashes: uint64 array from hash_items()
+            counts: Multiplicity of each hash (accepted for interface
+                    compatibility; repeats never change the registers)
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if hashes.size == 0:
+            return
+        
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        w = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rho = (64 - self.p) - bit_length(w) + 1
+        
+        registers = np.asarray(self.registers, dtype=np.int64)
+        np.maximum.at(registers, idx, rho)
+        self.registers = registers.tolist()
+    
+    def add_many(self, items):
+        """Add a batch of items through the vectorized path."""
+        self.add_hashes(self.hash_items(items))
+    
+    def add_run(self, item, count=1):
+        """
+        Add a run of `count` identical items, hashing and applying it once.
+        
+        Repeats never change the registers, so this is add() when count > 0.
+        """
+        if count > 0:
+            self.add(item)
+    
+    def add_runs(self, items, counts):
+        """Add a batch of runs (run-length encoded stream) through the vectorized path."""
+        items, counts = nonempty_runs(items, counts)
+        self.add_hashes(self.hash_items(items), counts)
+    
     def count(self):
         """
         Estimate the number of distinct elements.
@@ -78,6 +146,74 @@ class HyperLogLog:
         
         return E
     
+    def fold(self, p_target):
+        """
+        Fold the sketch down to a lower precision.
+        
+        Dropping the low d = p - p_target index bits turns them into the
+        top d bits of the rank word, so the result equals a
+        HyperLogLog(p_target) fed the same items:
+        - if the dropped bits b are nonzero, rho' = d - bit_length(b) + 1
+        - otherwise rho' = d + rho (the old rank, shifted by d)
+        Empty registers stay empty; each new register is the max of its
+        2^d source registers.
+        
+        Args:
+            p_target: Target precision (<= p)
+        
+        Returns:
+            New HyperLogLog with precision p_target
+        """
+        if not 0 < p_target <= self.p:
+            raise ValueError(f"p_target must be in [1, {self.p}], got {p_target}")
+        
+        folded = HyperLogLog(p=p_target)
+        folded.registers = fold_registers(self.registers, self.p, p_target).tolist()
+        return folded
+    
+    def merge(self, other):
+        """
+        Merge another HyperLogLog into a new sketch.
+        
+        The union's registers are the register-wise maxima, so the result
+        equals one HyperLogLog fed both streams.
+        
+        Args:
+            other: Another HyperLogLog instance (must have same p)
+        
+        Returns:
+            New merged HyperLogLog
+        """
+        if not isinstance(other, HyperLogLog):
+            raise TypeError("Can only merge with another HyperLogLog")
+        
+        if self.p != other.p:
+            raise ValueError(f"Cannot merge sketches with different p values: {self.p} vs {other.p}")
+        
+        merged = HyperLogLog(p=self.p)
+        merged.registers = np.maximum(self.registers, other.registers).tolist()
+        return merged
+    
+    def to_bytes(self):
+        """
+        Compact serialization: p, then one byte per register.
+        
+        Returns:
+            bytes of length 1 + 2^p (see from_bytes)
+        """
+        return bytes([self.p]) + np.asarray(self.registers, dtype=np.uint8).tobytes()
+    
+    def serialized_size(self):
+        """Length of to_bytes(), without serializing."""
+        return 1 + self.m
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a sketch serialized with to_bytes()."""
+        hll = cls(p=data[0])
+        hll.registers = np.frombuffer(data, dtype=np.uint8, offset=1).astype(np.int64).tolist()
+        return hll
+    
     def get_registers(self):
         """Return current register state (for debugging/analysis)."""
         return self.registers[:]
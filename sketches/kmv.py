@@ -11,8 +11,14 @@ Key characteristics:
 - Better theoretical guarantees than random sampling
 """
 
+import bisect
 import mmh3
 import math
+import struct
+
+import numpy as np
+
+from sketches.hashing import hash64_many, nonempty_runs
 
 
 class KMVSketch:
@@ -43,6 +49,14 @@ class KMVSketch:
         self.n = 0  # Total number of items added
         self.max_hash = 2 ** 64  # Maximum hash value (for normalization)
     
+    def hash_item(self, item):
+        """64-bit MurmurHash of an item, as used by add()."""
+        return mmh3.hash64(str(item), signed=False)[0]
+    
+    def hash_items(self, items):
+        """Hash a batch of items into a uint64 array (see add_hashes)."""
+        return hash64_many(items)
+    
     def add(self, item):
         """
         Add an item to the sketch.
@@ -51,18 +65,59 @@ class KMVSketch:
             item: Hashable object (typically string)
         """
         # Hash the item using MurmurHash (64-bit unsigned)
-        h = mmh3.hash64(str(item), signed=False)[0]
+        h = self.hash_item(item)
         
         self.n += 1
         
-        # Only consider if we don't have k items yet, or if hash is smaller than max
+        # Only consider if we don't have k items yet, or if hash is smaller than max.
+        # Repeated items hash to a value already retained and are ignored.
+        pos = bisect.bisect_left(self.min_values, h)
+        if pos < len(self.min_values) and self.min_values[pos] == h:
+            return
         if len(self.min_values) < self.k:
-            self.min_values.append(h)
-            self.min_values.sort()
-        elif h < self.min_values[-1]:
+            self.min_values.insert(pos, h)
+        elif pos < self.k:
             # Replace largest minimum with this smaller value
-            self.min_values[-1] = h
-            self.min_values.sort()
+            self.min_values.pop()
+            self.min_values.insert(pos, h)
+    
+    def add_hashes(self, hashes, counts=None):
+        """
+        Add a batch of pre-hashed items (vectorized equivalent of add()).
+        
+        Args:
+            hashes: uint64 array from hash_items()
+            counts: Optional multiplicity of each hash, so that n still
+                    counts every item when repeats were collapsed upstream
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        self.n += len(hashes) if counts is None else int(np.sum(counts))
+        if hashes.size == 0:
+            return
+        
+        if len(self.min_values) == self.k:
+            hashes = hashes[hashes < np.uint64(self.min_values[-1])]
+        combined = np.union1d(np.asarray(self.min_values, dtype=np.uint64), hashes)
+        self.min_values = combined[:self.k].tolist()
+    
+    def add_many(self, items):
+        """Add a batch of items through the vectorized path."""
+        self.add_hashes(self.hash_items(items))
+    
+    def add_run(self, item, count=1):
+        """
+        Add a run of `count` identical items, hashing and applying it once.
+        
+        Only n depends on the run length; the retained minima do not.
+        """
+        if count > 0:
+            self.add(item)
+            self.n += count - 1
+    
+    def add_runs(self, items, counts):
+        """Add a batch of runs (run-length encoded stream) through the vectorized path."""
+        items, counts = nonempty_runs(items, counts)
+        self.add_hashes(self.hash_items(items), counts)
     
     def cardinality(self):
         """
@@ -75,8 +130,9 @@ class KMVSketch:
             return 0.0
         
         if len(self.min_values) < self.k:
-            # If we haven't filled k slots, return exact count (lower bound)
-            return float(self.n)
+            # If we haven't filled k slots, every distinct hash is retained:
+            # return the exact distinct count
+            return float(len(self.min_values))
         
         # Get the k-th minimum value
         k_min = self.min_values[-1]
@@ -95,6 +151,39 @@ class KMVSketch:
         
         return estimate
     
+    def estimate_at_k(self, ks):
+        """
+        Estimates a KMV sketch of each smaller size would give, from this one.
+        
+        The k' smallest distinct hashes are the first k' retained minima,
+        so for every k' <= k this equals KMVSketch(k').cardinality() over
+        the same stream (and estimate_at_k([k]) equals cardinality()).
+        
+        Args:
+            ks: Sketch sizes, each in [1, k]
+        
+        Returns:
+            float64 array of estimates, one per size
+        """
+        ks = np.asarray(ks, dtype=np.int64)
+        if ks.size and (ks.min() < 1 or ks.max() > self.k):
+            raise ValueError(f"sizes must be in [1, {self.k}]")
+        
+        retained = len(self.min_values)
+        if retained == 0:
+            return np.zeros(ks.shape)
+        
+        minima = np.asarray(self.min_values, dtype=np.float64)
+        k_min = minima[np.minimum(ks, retained) - 1]
+        with np.errstate(divide='ignore'):
+            estimate = np.where(k_min == 0, float(self.n), (ks - 0.5) * float(self.max_hash) / k_min)
+        # Fewer than k' distinct hashes seen: the count is exact
+        return np.where(retained < ks, float(retained), estimate)
+    
+    def count(self):
+        """Alias of cardinality(), matching the HLL/FM/LC interface."""
+        return self.cardinality()
+    
     def cardinality_with_confidence(self):
         """
         Estimate cardinality with confidence interval.
@@ -159,6 +248,29 @@ class KMVSketch:
         merged.n = self.n + other.n
         
         return merged
+    
+    def to_bytes(self):
+        """
+        Compact serialization: k and n, then the retained hashes as uint64.
+        
+        Returns:
+            bytes (see from_bytes)
+        """
+        header = struct.pack('<QQ', self.k, self.n)
+        return header + np.asarray(self.min_values, dtype=np.uint64).tobytes()
+    
+    def serialized_size(self):
+        """Length of to_bytes(), without serializing."""
+        return 16 + 8 * len(self.min_values)
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a sketch serialized with to_bytes()."""
+        k, n = struct.unpack_from('<QQ', data)
+        sketch = cls(k=k)
+        sketch.n = n
+        sketch.min_values = np.frombuffer(data, dtype=np.uint64, offset=16).tolist()
+        return sketch
 
 
 class KMVUnion:
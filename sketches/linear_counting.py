@@ -8,10 +8,15 @@ Used to validate that order sensitivity is universal, not specific to HLL.
 import sys
 import os
 import mmh3
+import struct
 from math import log
 
+import numpy as np
+
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from sketches.hashing import nonempty_runs
+
 
 class LinearCounting:
     """
@@ -33,13 +38,49 @@ class LinearCounting:
         self.m = m
         self.bitmap = set()  # Use set for efficiency
         
+    def hash_item(self, element):
+        """Signed 32-bit MurmurHash of an element, as used by add()."""
+        return mmh3.hash(str(element), seed=0)
+    
+    def hash_items(self, elements):
+        """Hash a batch of elements into an int64 array (see add_hashes)."""
+        return np.array([mmh3.hash(str(element), seed=0) for element in elements], dtype=np.int64)
+    
     def add(self, element):
         """Add element to the sketch."""
         # Hash to uniform position
-        hash_value = mmh3.hash(str(element), seed=0)
+        hash_value = self.hash_item(element)
         position = abs(hash_value) % self.m
         self.bitmap.add(position)
     
+    def add_hashes(self, hashes, counts=None):
+        """
+        Add a batch of pre-hashed elements (vectorized equivalent of add()).
+        
+        counts (multiplicity of each hash) is accepted for interface
+        compatibility; repeats never change the bitmap.
+        """
+        hashes = np.asarray(hashes, dtype=np.int64)
+        self.bitmap.update((np.abs(hashes) % self.m).tolist())
+    
+    def add_many(self, elements):
+        """Add a batch of elements through the vectorized path."""
+        self.add_hashes(self.hash_items(elements))
+    
+    def add_run(self, element, count=1):
+        """
+        Add a run of `count` identical elements, hashing and applying it once.
+        
+        Repeats never change the bitmap, so this is add() when count > 0.
+        """
+        if count > 0:
+            self.add(element)
+    
+    def add_runs(self, elements, counts):
+        """Add a batch of runs (run-length encoded stream) through the vectorized path."""
+        elements, counts = nonempty_runs(elements, counts)
+        self.add_hashes(self.hash_items(elements), counts)
+    
     def count(self):
         """Estimate cardinality using Linear Counting formula."""
         X = len(self.bitmap)  # Number of occupied positions
@@ -61,10 +102,48 @@ class LinearCounting:
             return self.m
     
     def merge(self, other):
-        """Merge with another Linear Counting sketch."""
+        """
+        Merge another Linear Counting sketch into a new sketch.
+        
+        The union's bitmap is the union of the occupied positions, so the
+        result equals one sketch fed both streams. Neither input is
+        modified.
+        
+        Args:
+            other: Another LinearCounting instance (must have same m)
+        
+        Returns:
+            New merged LinearCounting
+        """
         if self.m != other.m:
             raise ValueError("Cannot merge sketches with different m")
-        self.bitmap.update(other.bitmap)
+        merged = LinearCounting(m=self.m)
+        merged.bitmap = self.bitmap | other.bitmap
+        return merged
+    
+    def to_bytes(self):
+        """
+        Compact serialization: m, then the bitmap packed 8 positions per byte.
+        
+        Returns:
+            bytes of length 8 + ceil(m / 8) (see from_bytes)
+        """
+        bits = np.zeros(self.m, dtype=bool)
+        bits[list(self.bitmap)] = True
+        return struct.pack('<Q', self.m) + np.packbits(bits, bitorder='little').tobytes()
+    
+    def serialized_size(self):
+        """Length of to_bytes(), without serializing."""
+        return 8 + (self.m + 7) // 8
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a sketch serialized with to_bytes()."""
+        (m,) = struct.unpack_from('<Q', data)
+        lc = cls(m=m)
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=8), count=m, bitorder='little')
+        lc.bitmap = set(np.flatnonzero(bits).tolist())
+        return lc
     
     def __repr__(self):
         return f"LinearCounting(m={self.m}, occupied={len(self.bitmap)})"
@@ -0,0 +1,158 @@
+"""
+Multi-Run HyperLogLog
+
+R independent HyperLogLog sketches updated side by side in one pass.
+
+HyperLogLog.add uses one unseeded 64-bit hash, so repeating a run on the
+same ordering reproduces it exactly. Here each item is hashed once with
+MurmurHash3 x64_128 and R hashes are derived from the two halves by
+double hashing (h1 + r * h2, then a SplitMix64 finalizer). Registers are
+a (runs, 2^p) uint8 array updated with one scatter-max per batch, so R
+runs cost roughly one hash pass plus R cheap NumPy updates.
+"""
+
+import mmh3
+
+import numpy as np
+
+from sketches.hashing import hash128_many, mix64, bit_length, nonempty_runs
+from sketches.hll import HyperLogLog
+
+
+def estimate_registers(registers, alpha):
+    """
+    HyperLogLog.count() for every row of a register array.
+
+    Args:
+        registers: Integer array shaped (..., 2^p)
+        alpha: Bias constant of the precision (HyperLogLog(p).alpha)
+
+    Returns:
+        float64 array shaped registers.shape[:-1]
+    """
+    m = registers.shape[-1]
+    Z = np.ldexp(1.0, -registers.astype(np.int32)).sum(axis=-1)
+    E = alpha * m * m / Z
+
+    # Small range correction
+    V = np.count_nonzero(registers == 0, axis=-1)
+    small = (E <= 2.5 * m) & (V > 0)
+    E = np.where(small, m * np.log(m / np.maximum(V, 1)), E)
+
+    # Large range correction
+    two32 = float(1 << 32)
+    large = (E > 2.5 * m) & (E > two32 / 30.0) & (E < two32)
+    return np.where(large, -two32 * np.log(np.where(large, 1.0 - E / two32, 1.0)), E)
+
+
+class MultiRunHLL:
+    """
+    R HyperLogLog sketches with independent hash functions.
+
+    Run r uses hash family member seed + r. Member 0 is the hash of
+    HyperLogLog.add, so with seed=0 run 0 matches a plain HyperLogLog.
+
+    Args:
+        p: Precision parameter of every run
+        runs: Number of independent runs R
+        seed: Index of the first hash family member
+    """
+
+    def __init__(self, p=10, runs=8, seed=0):
+        """
+        Initialize R empty sketches.
+
+        Args:
+            p: Precision (2^p registers per run)
+            runs: Number of runs
+            seed: First hash family member
+        """
+        if runs <= 0:
+            raise ValueError("runs must be positive")
+
+        self.p = p
+        self.m = 1 << p
+        self.runs = runs
+        self.seed = seed
+        self.registers = np.zeros((runs, self.m), dtype=np.uint8)
+        self.alpha = HyperLogLog(p).alpha
+
+        self._members = np.arange(seed, seed + runs, dtype=np.uint64)[:, None]
+        self._row_offset = (np.arange(runs, dtype=np.intp) * self.m)[:, None]
+
+    def hash_item(self, item):
+        """Both 64-bit halves of the 128-bit MurmurHash of an item."""
+        return np.array(mmh3.hash64(str(item), signed=False), dtype=np.uint64)
+
+    def hash_items(self, items):
+        """Hash a batch of items into an (n, 2) uint64 array (see add_hashes)."""
+        return hash128_many(items)
+
+    def _run_hashes(self, hashes):
+        """Derive the (runs, n) per-run 64-bit hashes from 128-bit hashes."""
+        h1 = hashes[:, 0][None, :]
+        h2 = hashes[:, 1][None, :]
+        derived = mix64(h1 + self._members * h2)
+        # Member 0 is h1 itself, the hash HyperLogLog uses
+        return np.where(self._members == 0, h1, derived)
+
+    def add(self, item):
+        """Add an item to every run."""
+        self.add_hashes(self.hash_item(item)[None, :])
+
+    def add_hashes(self, hashes, counts=None):
+        """
+        Add a batch of pre-hashed items to every run.
+
+        Args:
+            hashes: (n, 2) uint64 array from hash_items()
+            counts: Multiplicity of each hash (accepted for interface
+                    compatibility; repeats never change the registers)
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64).reshape(-1, 2)
+        if hashes.shape[0] == 0:
+            return
+        # Repeats never change registers; drop them before fanning out
+        _, first = np.unique(hashes[:, 0], return_index=True)
+        if len(first) < hashes.shape[0]:
+            hashes = hashes[first]
+
+        run_hashes = self._run_hashes(hashes)
+        idx = (run_hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        w = run_hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rho = ((64 - self.p) - bit_length(w) + 1).astype(np.uint8)
+
+        np.maximum.at(self.registers.reshape(-1), (idx + self._row_offset).ravel(), rho.ravel())
+
+    def add_many(self, items):
+        """Add a batch of items to every run."""
+        self.add_hashes(self.hash_items(items))
+
+    def add_run(self, item, count=1):
+        """Add a run of `count` identical items (add() when count > 0)."""
+        if count > 0:
+            self.add(item)
+
+    def add_runs(self, items, counts):
+        """Add a batch of runs (run-length encoded stream)."""
+        items, counts = nonempty_runs(items, counts)
+        self.add_hashes(self.hash_items(items), counts)
+
+    def count(self):
+        """
+        Estimate the number of distinct elements in every run.
+
+        Returns:
+            float64 array of R estimates (same corrections as HyperLogLog.count)
+        """
+        return estimate_registers(self.registers, self.alpha)
+
+    def get_sketch(self, run):
+        """Return run `run` as a standalone HyperLogLog."""
+        hll = HyperLogLog(self.p)
+        hll.registers = self.registers[run].astype(np.int64).tolist()
+        return hll
+
+    def get_registers(self):
+        """Return a copy of the (runs, 2^p) register array."""
+        return self.registers.copy()
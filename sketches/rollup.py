@@ -0,0 +1,268 @@
+"""
+Tumbling-Window Sketch Rollups
+
+Distinct counts over arbitrary time ranges of a timestamped stream
+without rescanning it.
+
+Items are hashed once and added to one mergeable sketch per fine time
+bucket (one minute by default). Most fine buckets hold a handful of
+items, so a bucket keeps its distinct hashes in a small sorted array
+(the HLL++ "sparse" idea) until there are more than sparse_limit of
+them, and only then becomes a sketch. Buckets roll up hierarchically
+(minute -> hour -> day, then binary levels over days); a parent is
+rebuilt by merging its children when a query needs it (or on build())
+and one of them changed. A range query is split into the few aligned
+nodes that tile it (at most fanout - 1 per level and side) and answered
+by merging them, so a query over a year of data merges a couple of
+hundred small sketches instead of replaying millions of items.
+
+Works with any sketch providing hash_items/add_hashes and a merge()
+that returns a new sketch: HyperLogLog, KMVSketch, ThetaSketch.
+"""
+
+import copy
+import math
+
+import numpy as np
+
+from sketches.hll import HyperLogLog
+
+
+# Minutes -> hours -> days, then binary levels over days (2^20 days)
+DEFAULT_FANOUTS = (60, 24) + (2,) * 20
+SPARSE_LIMIT = 256  # Distinct hashes a bucket keeps before becoming a sketch
+
+
+class TimeRollup:
+    """
+    Hierarchy of per-bucket sketches over time.
+
+    Level 0 holds one sketch per bucket of bucket_seconds; a node at
+    level l covers fanouts[l - 1] nodes of level l - 1. Nodes are stored
+    sparsely, so empty periods cost nothing.
+
+    Args:
+        sketch_factory: Callable returning an empty mergeable sketch
+        bucket_seconds: Width of the finest bucket (query resolution)
+        fanouts: Children per node at each level above the buckets
+        sparse_limit: Distinct hashes a bucket keeps before becoming a sketch
+    """
+
+    def __init__(self, sketch_factory=HyperLogLog, bucket_seconds=60, fanouts=DEFAULT_FANOUTS,
+                 sparse_limit=SPARSE_LIMIT):
+        """
+        Initialize an empty rollup.
+
+        Args:
+            sketch_factory: e.g. HyperLogLog or functools.partial(KMVSketch, k=1024)
+            bucket_seconds: Bucket width, in the units of the timestamps
+            fanouts: Tuple of fanouts, lowest level first
+            sparse_limit: Bucket size (distinct hashes) at which a sparse
+                          bucket is converted to a sketch; 0 disables
+        """
+        if bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be positive")
+        if any(f < 2 for f in fanouts):
+            raise ValueError("fanouts must be at least 2")
+
+        self.sketch_factory = sketch_factory
+        self.bucket_seconds = bucket_seconds
+        self.fanouts = tuple(fanouts)
+        self.sparse_limit = sparse_limit
+        self._prototype = sketch_factory()
+
+        # nodes[l]: {index: sketch, or sorted hash array for sparse buckets};
+        # stale[l]: indices whose children changed
+        self.nodes = [{} for _ in range(len(self.fanouts) + 1)]
+        self.stale = [set() for _ in range(len(self.fanouts) + 1)]
+
+        # Buckets per node at each level
+        self.spans = [1]
+        for f in self.fanouts:
+            self.spans.append(self.spans[-1] * f)
+
+        self.n = 0
+        self.first_bucket = None  # Bucket range with data, [first, last]
+        self.last_bucket = None
+
+    def bucket_of(self, timestamps):
+        """Bucket index of each timestamp."""
+        return np.floor(np.asarray(timestamps, dtype=np.float64) / self.bucket_seconds).astype(np.int64)
+
+    def add(self, item, timestamp):
+        """Add one item at a timestamp."""
+        self.add_many([item], [timestamp])
+
+    def add_many(self, items, timestamps):
+        """
+        Add a batch of items; each item is hashed once.
+
+        Args:
+            items: Stream items
+            timestamps: Time of each item (e.g. Unix seconds)
+        """
+        self.add_hashes(self._prototype.hash_items(items), timestamps)
+
+    def add_hashes(self, hashes, timestamps):
+        """
+        Add a batch of pre-hashed items to their buckets.
+
+        Args:
+            hashes: Array from the sketch type's hash_items()
+            timestamps: Time of each item
+        """
+        buckets = self.bucket_of(timestamps)
+        if buckets.size == 0:
+            return
+
+        order = np.argsort(buckets, kind='stable')
+        buckets = buckets[order]
+        hashes = np.asarray(hashes)[order]
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)]
+        # Sparse buckets only work for one hash per item (not FM's hash matrix)
+        sparse = self.sparse_limit > 0 and hashes.ndim == 1
+
+        level0 = self.nodes[0]
+        for bucket, lo, hi in zip(buckets[starts].tolist(), starts.tolist(), ends.tolist()):
+            node = level0.get(bucket)
+            if sparse and (node is None or isinstance(node, np.ndarray)):
+                node = np.union1d(node, hashes[lo:hi]) if node is not None else np.unique(hashes[lo:hi])
+                if len(node) > self.sparse_limit:
+                    node = self._sketch_of([node])
+                level0[bucket] = node
+                continue
+            if node is None:
+                node = level0[bucket] = self.sketch_factory()
+            node.add_hashes(hashes[lo:hi])
+
+        # Every ancestor of a touched bucket must be re-merged before use
+        touched = buckets[starts]
+        for level in range(1, len(self.spans)):
+            self.stale[level].update(np.unique(touched // self.spans[level]).tolist())
+
+        self.n += len(buckets)
+        if self.first_bucket is None or buckets[0] < self.first_bucket:
+            self.first_bucket = int(buckets[0])
+        if self.last_bucket is None or buckets[-1] > self.last_bucket:
+            self.last_bucket = int(buckets[-1])
+
+    def _sketch_of(self, nodes):
+        """
+        One new sketch for a non-empty list of sketches and sparse hash arrays.
+
+        Inputs are not modified.
+        """
+        sketches = [node for node in nodes if not isinstance(node, np.ndarray)]
+        sparse = [node for node in nodes if isinstance(node, np.ndarray)]
+        if sparse:
+            sketch = self.sketch_factory()
+            sketch.add_hashes(np.concatenate(sparse))
+            sketches.append(sketch)
+        elif len(sketches) == 1:
+            return copy.deepcopy(sketches[0])
+        return _merge_all(sketches)
+
+    def _node(self, level, index):
+        """Node contents (None if empty), re-merging it from its children if stale."""
+        if level > 0 and index in self.stale[level]:
+            fanout = self.fanouts[level - 1]
+            children = [self._node(level - 1, child) for child in range(index * fanout, (index + 1) * fanout)]
+            children = [child for child in children if child is not None]
+            if len(children) == 1 and not isinstance(children[0], np.ndarray):
+                # Share the child; merges never modify their inputs
+                self.nodes[level][index] = children[0]
+            else:
+                self.nodes[level][index] = self._sketch_of(children)
+            self.stale[level].discard(index)
+        return self.nodes[level].get(index)
+
+    def build(self):
+        """Re-merge every stale node now, lowest level first, so queries only merge."""
+        for level in range(1, len(self.nodes)):
+            for index in sorted(self.stale[level]):
+                self._node(level, index)
+
+    def decompose(self, first, last):
+        """
+        Aligned nodes that exactly tile buckets [first, last).
+
+        Returns:
+            List of (level, index) pairs
+        """
+        nodes = []
+        level = 0
+        while first < last:
+            if level == len(self.fanouts):
+                nodes.extend((level, index) for index in range(first, last))
+                break
+            fanout = self.fanouts[level]
+            while first < last and first % fanout:
+                nodes.append((level, first))
+                first += 1
+            while first < last and last % fanout:
+                last -= 1
+                nodes.append((level, last))
+            first //= fanout
+            last //= fanout
+            level += 1
+        return nodes
+
+    def time_range(self):
+        """(start, end) covering every bucket with data, or None if empty."""
+        if self.first_bucket is None:
+            return None
+        return self.first_bucket * self.bucket_seconds, (self.last_bucket + 1) * self.bucket_seconds
+
+    def merged(self, start=None, end=None):
+        """
+        One sketch for all items with start <= timestamp < end.
+
+        Bounds are widened to whole buckets.
+
+        Args:
+            start: Range start (default: earliest data)
+            end: Range end (default: latest data)
+
+        Returns:
+            Merged sketch (empty if the range has no data)
+        """
+        bounds = self.time_range()
+        if bounds is None:
+            return self.sketch_factory()
+        if start is None:
+            start = bounds[0]
+        if end is None:
+            end = bounds[1]
+
+        first = math.floor(start / self.bucket_seconds)
+        last = math.ceil(end / self.bucket_seconds)
+        nodes = [self._node(level, index) for level, index in self.decompose(first, last)]
+        nodes = [node for node in nodes if node is not None]
+        if not nodes:
+            return self.sketch_factory()
+        # _sketch_of never hands out a stored node
+        return self._sketch_of(nodes)
+
+    def count(self, start=None, end=None):
+        """Estimated distinct items with start <= timestamp < end."""
+        return self.merged(start, end).count()
+
+    def get_stats(self):
+        """Number of stored nodes per level."""
+        return {
+            'items': self.n,
+            'buckets': len(self.nodes[0]),
+            'nodes_per_level': [len(level) for level in self.nodes],
+            'stale_nodes': sum(len(level) for level in self.stale)
+        }
+
+
+def _merge_all(sketches):
+    """Merge a non-empty list of sketches pairwise (inputs are not modified)."""
+    while len(sketches) > 1:
+        merged = [a.merge(b) for a, b in zip(sketches[0::2], sketches[1::2])]
+        if len(sketches) % 2:
+            merged.append(sketches[-1])
+        sketches = merged
+    return sketches[0]
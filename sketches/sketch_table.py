@@ -0,0 +1,203 @@
+"""
+Keyed Sketch Table
+
+Distinct counters for many keys (distinct actors per repository,
+distinct recipients per sender) without one Python sketch object per
+key. Every key owns one row of a preallocated 2D uint8 array: 2^p
+HyperLogLog registers, or an m-bit Linear Counting bitmap packed 8 bits
+per byte. A dict maps keys to rows. A batch of (key, item) pairs is
+hashed once and applied with a single scatter-max (HLL) or scatter-or
+(LC), and the estimates of all keys are computed in one vectorized pass,
+so memory stays near keys x row size.
+
+Row r holds exactly the registers / bitmap of a HyperLogLog(p) /
+LinearCounting(m) fed the items of its key, and get_sketch() returns it
+as one. HLL estimates match HyperLogLog.count(); LC estimates match
+LinearCounting.count() up to float rounding (np.log vs math.log).
+"""
+
+import numpy as np
+
+from sketches.hashing import hash64_many, bit_length
+from sketches.hll import HyperLogLog
+from sketches.linear_counting import LinearCounting
+from sketches.multi_hll import estimate_registers
+
+
+# Number of set bits in every byte value
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+class SketchTable:
+    """
+    One HyperLogLog (or Linear Counting bitmap) per key, stored as rows
+    of a single uint8 array.
+
+    The array grows by doubling as keys arrive; pass capacity to
+    preallocate when the number of keys is known.
+
+    Args:
+        kind: 'hll' (2^p registers per key) or 'lc' (m-bit bitmap per key)
+        p: HyperLogLog precision
+        m: Linear Counting bitmap size in bits (multiple of 8)
+        capacity: Rows to preallocate
+    """
+
+    def __init__(self, kind='hll', p=10, m=16384, capacity=1024):
+        """
+        Initialize an empty table.
+
+        Args:
+            kind: 'hll' or 'lc'
+            p: Precision (number of index bits) for 'hll'
+            m: Bitmap bits for 'lc'
+            capacity: Initial number of rows
+        """
+        if kind == 'hll':
+            self.p = p
+            self.m = 1 << p
+            self.row_bytes = self.m
+            self.alpha = HyperLogLog(p).alpha
+        elif kind == 'lc':
+            if m % 8:
+                raise ValueError("m must be a multiple of 8")
+            self.m = m
+            self.row_bytes = m // 8
+        else:
+            raise ValueError(f"Unknown kind: {kind}")
+
+        self.kind = kind
+        self.index = {}  # key -> row, in insertion order
+        self.rows = np.zeros((max(capacity, 1), self.row_bytes), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        """Keys in row order."""
+        return list(self.index)
+
+    @property
+    def nbytes(self):
+        """Bytes used by the rows of the keys seen so far."""
+        return len(self.index) * self.row_bytes
+
+    def hash_items(self, items):
+        """Hash a batch of items as HyperLogLog / LinearCounting would (see add_hashes)."""
+        if self.kind == 'hll':
+            return hash64_many(items)
+        return LinearCounting(self.m).hash_items(items)
+
+    def _reserve(self, n):
+        """Grow the row array (by doubling) to hold at least n rows."""
+        if n <= len(self.rows):
+            return
+        capacity = len(self.rows)
+        while capacity < n:
+            capacity *= 2
+        rows = np.zeros((capacity, self.row_bytes), dtype=np.uint8)
+        rows[:len(self.rows)] = self.rows
+        self.rows = rows
+
+    def rows_for(self, keys):
+        """
+        Row of each key, assigning new rows to unseen keys.
+
+        Args:
+            keys: Sequence of keys
+
+        Returns:
+            intp array of row numbers
+        """
+        index = self.index
+        rows = np.fromiter((index.setdefault(key, len(index)) for key in keys),
+                           dtype=np.intp, count=len(keys))
+        self._reserve(len(index))
+        return rows
+
+    def add(self, key, item):
+        """Add one item to a key's sketch."""
+        self.add_pairs([key], [item])
+
+    def add_pairs(self, keys, items):
+        """
+        Add a batch of (key, item) pairs; each item is hashed once.
+
+        Args:
+            keys: Key of each pair
+            items: Item of each pair
+        """
+        if len(keys) != len(items):
+            raise ValueError("keys and items must have the same length")
+        self.add_hashes(self.rows_for(keys), self.hash_items(items))
+
+    def add_hashes(self, rows, hashes):
+        """
+        Add a batch of pre-hashed items to the given rows with one scatter.
+
+        Args:
+            rows: Row of each item (from rows_for())
+            hashes: Array from hash_items()
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        if rows.size == 0:
+            return
+        flat = self.rows.reshape(-1)
+
+        if self.kind == 'hll':
+            hashes = np.asarray(hashes, dtype=np.uint64)
+            idx = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+            w = hashes & np.uint64((1 << (64 - self.p)) - 1)
+            rho = ((64 - self.p) - bit_length(w) + 1).astype(np.uint8)
+            np.maximum.at(flat, rows * self.row_bytes + idx, rho)
+        else:
+            positions = np.abs(np.asarray(hashes, dtype=np.int64)) % self.m
+            bits = (np.uint8(1) << (positions & 7).astype(np.uint8)).astype(np.uint8)
+            np.bitwise_or.at(flat, rows * self.row_bytes + (positions >> 3), bits)
+
+    def counts(self, keys=None):
+        """
+        Estimated distinct items of many keys at once.
+
+        Args:
+            keys: Keys to estimate (default: every key, in row order);
+                  unseen keys estimate 0
+
+        Returns:
+            float64 array of estimates
+        """
+        if keys is None:
+            rows = self.rows[:len(self.index)]
+        else:
+            index = self.index
+            at = np.fromiter((index.get(key, -1) for key in keys), dtype=np.intp, count=len(keys))
+            rows = np.where((at >= 0)[:, None], self.rows[np.maximum(at, 0)], 0).astype(np.uint8)
+
+        if self.kind == 'hll':
+            return estimate_registers(rows, self.alpha)
+
+        # Linear Counting, with LinearCounting.count()'s edge cases
+        occupied = POPCOUNT[rows].sum(axis=1)
+        ratio = occupied / self.m
+        with np.errstate(divide='ignore'):
+            estimates = -self.m * np.log(1 - ratio)
+        estimates = np.where(occupied >= self.m, self.m * np.log(self.m), estimates)
+        return np.where(occupied == 0, 0.0, estimates)
+
+    def count(self, key):
+        """Estimated distinct items of one key (0 if unseen)."""
+        return float(self.counts([key])[0])
+
+    def get_sketch(self, key):
+        """Return a key's row as a standalone HyperLogLog or LinearCounting."""
+        row = self.rows[self.index[key]]
+        if self.kind == 'hll':
+            hll = HyperLogLog(self.p)
+            hll.registers = row.astype(np.int64).tolist()
+            return hll
+        lc = LinearCounting(self.m)
+        lc.bitmap = set(np.flatnonzero(np.unpackbits(row, bitorder='little')).tolist())
+        return lc
@@ -0,0 +1,189 @@
+"""
+Sliding-Window HyperLogLog
+
+Distinct count over the last N items (or the last T time units) at any
+moment, instead of since the start of the stream.
+
+A plain HyperLogLog register only keeps the maximum rank ever seen. For
+a window, a register must also know which smaller ranks could become
+its maximum once older items expire: its list of possible future maxima
+(LPFM), i.e. (timestamp, rank) pairs where every later pair has a lower
+rank. Ranks are small integers (1..64-p+1), so the lists of all
+registers are stored as one dense (2^p, 65-p) table of the last
+timestamp each rank was seen at: the LPFM of a register is the subset
+of its row not dominated by a newer, higher rank. Memory is fixed by p,
+a batch of items is one scatter-max into the table, and a window query
+reads the table once, independent of stream length and window size.
+"""
+
+import mmh3
+
+import numpy as np
+
+from sketches.hashing import hash64_many, bit_length, nonempty_runs
+from sketches.hll import HyperLogLog
+from sketches.multi_hll import estimate_registers
+
+
+class SlidingHyperLogLog:
+    """
+    HyperLogLog over a sliding window of positions or timestamps.
+
+    Items are stamped with their 1-based stream position unless explicit
+    timestamps are given (any numbers, e.g. seconds). count(window)
+    estimates the distinct items with timestamp > now - window, and
+    equals HyperLogLog(p).count() over exactly those items.
+
+    Args:
+        p: Precision parameter (2^p registers)
+        window: Default window length for count() (None = whole stream)
+    """
+
+    def __init__(self, p=10, window=None):
+        """
+        Initialize an empty sliding-window sketch.
+
+        Args:
+            p: Precision (number of index bits)
+            window: Default window length, in items or time units
+        """
+        self.p = p
+        self.m = 1 << p
+        self.window = window
+        self.max_rank = 64 - p + 1
+        self.alpha = HyperLogLog(p).alpha
+
+        # last_seen[j, r - 1]: latest timestamp of rank r in register j
+        self.last_seen = np.full((self.m, self.max_rank), -np.inf)
+        self.n = 0  # Items added (the position of the last one)
+        self.now = -np.inf  # Latest timestamp added
+
+    def hash_item(self, item):
+        """64-bit MurmurHash of an item, as used by HyperLogLog.add()."""
+        return mmh3.hash64(str(item), signed=False)[0]
+
+    def hash_items(self, items):
+        """Hash a batch of items into a uint64 array (see add_hashes)."""
+        return hash64_many(items)
+
+    def add(self, item, timestamp=None):
+        """
+        Add an item.
+
+        Args:
+            item: Hashable object (typically string)
+            timestamp: Time of the item (default: its stream position)
+        """
+        self.add_hashes(np.array([self.hash_item(item)], dtype=np.uint64),
+                        timestamps=None if timestamp is None else [timestamp])
+
+    def add_hashes(self, hashes, counts=None, *, timestamps=None):
+        """
+        Add a batch of pre-hashed items with one scatter-max.
+
+        Args:
+            hashes: uint64 array from hash_items()
+            counts: Multiplicity of each hash: a run of counts[i] copies
+                    of item i, stamped at the run's last position
+            timestamps: Time of each hash (keyword only; default: its
+                        stream position, counting runs)
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if counts is not None:
+            counts = np.asarray(counts, dtype=np.int64)
+            if (counts <= 0).any():
+                raise ValueError("counts must be positive")
+        if hashes.size == 0:
+            return
+
+        if counts is None:
+            ends = np.arange(self.n + 1, self.n + hashes.size + 1, dtype=np.int64)
+        else:
+            ends = self.n + np.cumsum(counts)
+        if timestamps is None:
+            timestamps = ends.astype(np.float64)
+        else:
+            timestamps = np.asarray(timestamps, dtype=np.float64)
+
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        w = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rho = (64 - self.p) - bit_length(w) + 1
+
+        np.maximum.at(self.last_seen.reshape(-1), idx * self.max_rank + (rho - 1), timestamps)
+        self.n = int(ends[-1])
+        self.now = max(self.now, float(timestamps.max()))
+
+    def add_many(self, items, timestamps=None):
+        """Add a batch of items through the vectorized path."""
+        self.add_hashes(self.hash_items(items), timestamps=timestamps)
+
+    def add_run(self, item, count=1):
+        """Add a run of `count` identical items; only the last occurrence matters."""
+        if count > 0:
+            self.n += count - 1
+            self.add(item)
+
+    def add_runs(self, items, counts):
+        """Add a batch of runs (run-length encoded stream), stamped at each run's last position."""
+        items, counts = nonempty_runs(items, counts)
+        self.add_hashes(self.hash_items(items), counts)
+
+    def get_registers(self, window=None, now=None):
+        """
+        HyperLogLog registers of the items in a window.
+
+        Args:
+            window: Window length (default: self.window; whole stream if
+                    both are None, or with float('inf'))
+            now: Current time (default: latest timestamp added); may be
+                 later than the last item, not earlier
+
+        Returns:
+            int64 array of 2^p registers
+        """
+        if window is None:
+            window = self.window
+        if now is None:
+            now = self.now
+        start = -np.inf if window is None else now - window
+
+        live = self.last_seen > start
+        # Highest live rank per register; 0 if none is live
+        top = np.argmax(live[:, ::-1], axis=1)
+        return np.where(live.any(axis=1), self.max_rank - top, 0).astype(np.int64)
+
+    def count(self, window=None, now=None):
+        """
+        Estimate the number of distinct items in a window.
+
+        Args:
+            window: Window length (default: self.window; whole stream if
+                    both are None, or with float('inf'))
+            now: Current time (default: latest timestamp added)
+
+        Returns:
+            Estimated cardinality (same corrections as HyperLogLog.count)
+        """
+        return float(estimate_registers(self.get_registers(window, now), self.alpha))
+
+    def get_sketch(self, window=None, now=None):
+        """Return the window as a standalone HyperLogLog."""
+        hll = HyperLogLog(self.p)
+        hll.registers = self.get_registers(window, now).tolist()
+        return hll
+
+    def future_maxima(self, register):
+        """
+        List of possible future maxima of one register.
+
+        Returns:
+            (timestamp, rank) pairs, oldest first; ranks strictly decrease
+        """
+        times = self.last_seen[register]
+        pairs = []
+        latest = -np.inf
+        for rank in range(self.max_rank, 0, -1):
+            if times[rank - 1] > latest:
+                latest = times[rank - 1]
+                pairs.append((float(latest), rank))
+        return pairs
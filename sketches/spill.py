@@ -0,0 +1,226 @@
+"""
+Spill-to-Disk Sketch Collection
+
+One sketch per key for keyed workloads with a long tail of cold keys.
+Recently used sketches stay in memory up to a byte budget; when it is
+exceeded, the least recently used ones are written in their compact
+to_bytes() form to a local SQLite key-value file and dropped from
+memory. Accessing a spilled key faults it back in with from_bytes().
+Memory is therefore bounded by the budget, however many keys there are.
+
+The budget counts the compact serialized size of the resident sketches
+(serialized_size(), which does not serialize), not the Python object
+overhead. Works with any sketch providing hash_items/add_hashes/count
+and to_bytes/from_bytes/serialized_size: HyperLogLog, KMVSketch,
+ThetaSketch, LinearCounting, FlajoletMartin.
+"""
+
+import os
+import pickle
+import sqlite3
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from sketches.hll import HyperLogLog
+
+
+class SpillingSketchCollection:
+    """
+    LRU cache of per-key sketches backed by an on-disk store.
+
+    Keys are pickled to address the store, so they must pickle
+    deterministically (str, int, tuples of them).
+
+    Args:
+        sketch_factory: Callable returning an empty sketch
+        memory_budget: Bytes of resident sketches (compact size) before spilling
+        path: SQLite file for spilled sketches (default: a temporary file,
+              removed on close())
+    """
+
+    def __init__(self, sketch_factory=HyperLogLog, memory_budget=64 << 20, path=None):
+        """
+        Initialize an empty collection.
+
+        Args:
+            sketch_factory: e.g. HyperLogLog or functools.partial(KMVSketch, k=256)
+            memory_budget: Resident byte budget
+            path: Spill file location; an existing file is reopened
+        """
+        if memory_budget <= 0:
+            raise ValueError("memory_budget must be positive")
+
+        self.sketch_factory = sketch_factory
+        self.memory_budget = memory_budget
+        self._prototype = sketch_factory()
+        self._cls = type(self._prototype)
+
+        self._temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.sqlite')
+            os.close(fd)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        # A spill file is scratch space: skip the journal fsyncs
+        self._db.execute('PRAGMA synchronous = OFF')
+        self._db.execute('CREATE TABLE IF NOT EXISTS sketches (key BLOB PRIMARY KEY, data BLOB NOT NULL)')
+
+        self.hot = OrderedDict()  # key -> sketch, least recently used first
+        self.sizes = {}  # key -> compact size of a resident sketch
+        self.dirty = set()  # Resident keys changed since they were last written
+
+        # Metrics
+        self.bytes_in_memory = 0
+        self.evictions = 0
+        self.faults = 0
+        self.writes = 0
+
+    def _key_bytes(self, key):
+        return pickle.dumps(key, protocol=4)
+
+    def _load(self, key, create=True):
+        """Resident sketch of a key, faulting it in from disk (or creating it)."""
+        sketch = self.hot.get(key)
+        if sketch is not None:
+            self.hot.move_to_end(key)
+            return sketch
+
+        row = self._db.execute('SELECT data FROM sketches WHERE key = ?', (self._key_bytes(key),)).fetchone()
+        if row is not None:
+            sketch = self._cls.from_bytes(row[0])
+            self.faults += 1
+        elif create:
+            sketch = self.sketch_factory()
+            self.dirty.add(key)
+        else:
+            return None
+
+        self.hot[key] = sketch
+        self._update_size(key)
+        return sketch
+
+    def _update_size(self, key):
+        """Re-measure a resident sketch after it changed."""
+        size = self.hot[key].serialized_size()
+        self.bytes_in_memory += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+
+    def _evict(self):
+        """Spill least recently used sketches until the budget holds (the newest always stays)."""
+        spilled = []
+        while self.bytes_in_memory > self.memory_budget and len(self.hot) > 1:
+            key, sketch = self.hot.popitem(last=False)
+            self.bytes_in_memory -= self.sizes.pop(key)
+            if key in self.dirty:
+                # Clean sketches are already on disk unchanged
+                spilled.append((self._key_bytes(key), sketch.to_bytes()))
+                self.dirty.discard(key)
+            self.evictions += 1
+        if spilled:
+            self._db.executemany('INSERT OR REPLACE INTO sketches VALUES (?, ?)', spilled)
+            self._db.commit()
+            self.writes += len(spilled)
+
+    def get(self, key):
+        """
+        Sketch of a key (created empty if new), made most recently used.
+
+        The sketch is assumed to be modified by the caller and will be
+        written back when evicted.
+        """
+        sketch = self._load(key)
+        self.dirty.add(key)
+        self._update_size(key)
+        self._evict()
+        return sketch
+
+    def add(self, key, item):
+        """Add one item to a key's sketch."""
+        self.add_pairs([key], [item])
+
+    def add_pairs(self, keys, items):
+        """
+        Add a batch of (key, item) pairs; items are hashed once and each
+        key's items are applied with one add_hashes() call.
+
+        Args:
+            keys: Key of each pair
+            items: Item of each pair
+        """
+        if len(keys) != len(items):
+            raise ValueError("keys and items must have the same length")
+        if len(keys) == 0:
+            return
+
+        hashes = self._prototype.hash_items(items)
+        # Group in Python so keys keep their type (NumPy would coerce 1 and 'a' to str)
+        positions = {}
+        for i, key in enumerate(keys):
+            positions.setdefault(key, []).append(i)
+
+        for key, at in positions.items():
+            sketch = self._load(key)
+            sketch.add_hashes(hashes[np.array(at, dtype=np.intp)])
+            self.dirty.add(key)
+            self._update_size(key)
+            self._evict()
+
+    def count(self, key):
+        """Estimated distinct items of a key (0 if unseen)."""
+        sketch = self._load(key, create=False)
+        self._evict()
+        if sketch is None:
+            return self._prototype.count()
+        return sketch.count()
+
+    def flush(self):
+        """Write every changed resident sketch to disk (they stay resident)."""
+        spilled = [(self._key_bytes(key), self.hot[key].to_bytes()) for key in self.dirty]
+        if spilled:
+            self._db.executemany('INSERT OR REPLACE INTO sketches VALUES (?, ?)', spilled)
+            self.writes += len(spilled)
+        self._db.commit()
+        self.dirty.clear()
+
+    def __len__(self):
+        self.flush()
+        return self._db.execute('SELECT COUNT(*) FROM sketches').fetchone()[0]
+
+    def items(self):
+        """
+        Yield (key, sketch) for every key without changing what is resident.
+
+        Spilled sketches are decoded on the fly and not cached.
+        """
+        self.flush()
+        for key_bytes, data in self._db.execute('SELECT key, data FROM sketches'):
+            key = pickle.loads(key_bytes)
+            sketch = self.hot.get(key)
+            yield key, sketch if sketch is not None else self._cls.from_bytes(data)
+
+    def get_stats(self):
+        """Memory and paging metrics."""
+        return {
+            'resident_keys': len(self.hot),
+            'bytes_in_memory': self.bytes_in_memory,
+            'memory_budget': self.memory_budget,
+            'evictions': self.evictions,
+            'faults': self.faults,
+            'writes': self.writes
+        }
+
+    def close(self):
+        """Write back resident sketches and close the spill file (deleting it if temporary)."""
+        if not self._temporary:
+            self.flush()
+        self._db.close()
+        if self._temporary:
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -13,6 +13,11 @@ Key characteristics:
 
 import mmh3
 import math
+import struct
+
+import numpy as np
+
+from sketches.hashing import hash64_many, nonempty_runs
 
 
 class ThetaSketch:
@@ -40,7 +45,7 @@ class ThetaSketch:
             raise ValueError(f"k={k} must be a power of 2")
         
         self.k = k
-        self.entries = set()  # Set of (hash_value, item) tuples
+        self.entries = set()  # Set of retained normalized hash values
         self.theta = 1.0  # Initially accept all items
         self.num_retained = 0  # Number of entries kept
         self.is_empty = True
@@ -48,6 +53,14 @@ class ThetaSketch:
         # Estimator accuracy constant
         self.c = 2.0  # Empirically determined constant
     
+    def hash_item(self, item):
+        """64-bit MurmurHash of an item, as used by add()."""
+        return mmh3.hash64(str(item), signed=False)[0]
+    
+    def hash_items(self, items):
+        """Hash a batch of items into a uint64 array (see add_hashes)."""
+        return hash64_many(items)
+    
     def add(self, item):
         """
         Add an item to the sketch.
@@ -56,14 +69,14 @@ class ThetaSketch:
             item: Hashable object (typically string)
         """
         # Hash the item using MurmurHash (64-bit)
-        h = mmh3.hash64(str(item), signed=False)[0]
+        h = self.hash_item(item)
         
         # Normalize hash to [0, 1) range
         hash_value = h / (2 ** 64)
         
         # Only add if hash is below theta threshold
         if hash_value < self.theta:
-            self.entries.add((hash_value, str(item)))
+            self.entries.add(hash_value)
             self.num_retained = len(self.entries)
             self.is_empty = False
             
@@ -71,6 +84,48 @@ class ThetaSketch:
             if self.num_retained > self.k:
                 self._resize()
     
+    def add_hashes(self, hashes, counts=None):
+        """
+        Add a batch of pre-hashed items (vectorized equivalent of add()).
+        
+        Resizing once at the end keeps the same k smallest hashes and the
+        same theta as resizing after every item.
+        
+        Args:
+            hashes: uint64 array from hash_items()
+            counts: Multiplicity of each hash (accepted for interface
+                    compatibility; repeats never change the retained set)
+        """
+        hash_values = np.asarray(hashes, dtype=np.uint64).astype(np.float64) / (2 ** 64)
+        hash_values = hash_values[hash_values < self.theta]
+        if hash_values.size == 0:
+            return
+        
+        self.entries.update(np.unique(hash_values).tolist())
+        self.num_retained = len(self.entries)
+        self.is_empty = False
+        
+        if self.num_retained > self.k:
+            self._resize()
+    
+    def add_many(self, items):
+        """Add a batch of items through the vectorized path."""
+        self.add_hashes(self.hash_items(items))
+    
+    def add_run(self, item, count=1):
+        """
+        Add a run of `count` identical items, hashing and applying it once.
+        
+        Repeats never change the retained set, so this is add() when count > 0.
+        """
+        if count > 0:
+            self.add(item)
+    
+    def add_runs(self, items, counts):
+        """Add a batch of runs (run-length encoded stream) through the vectorized path."""
+        items, counts = nonempty_runs(items, counts)
+        self.add_hashes(self.hash_items(items), counts)
+    
     def _resize(self):
         """
         Reduce sketch size to k entries by updating theta.
@@ -78,12 +133,12 @@ class ThetaSketch:
         """
         if len(self.entries) > self.k:
             # Sort by hash value and keep the k entries with smallest hashes
-            sorted_entries = sorted(self.entries, key=lambda x: x[0])
+            sorted_entries = sorted(self.entries)
             self.entries = set(sorted_entries[:self.k])
             
             # Update theta to next largest hash value not in sketch
             if len(self.entries) == self.k and len(sorted_entries) > self.k:
-                self.theta = sorted_entries[self.k][0]
+                self.theta = sorted_entries[self.k]
             
             self.num_retained = len(self.entries)
     
@@ -117,9 +172,54 @@ class ThetaSketch:
         
         return estimate
     
+    def estimate_at_k(self, ks):
+        """
+        Estimates a Theta sketch of each smaller nominal size would give.
+        
+        A sketch of size k' <= k fed the same stream retains the k'
+        smallest hashes with theta at the (k'+1)-th smallest, or every
+        hash with theta = 1 if it never overflowed; both are read off the
+        sorted entries here and run through the cardinality() rule, so
+        estimate_at_k([k]) equals cardinality().
+        
+        Args:
+            ks: Nominal sizes, each in [1, k]
+        
+        Returns:
+            float64 array of estimates, one per size
+        """
+        ks = np.asarray(ks, dtype=np.int64)
+        if ks.size and (ks.min() < 1 or ks.max() > self.k):
+            raise ValueError(f"sizes must be in [1, {self.k}]")
+        
+        entries = np.sort(np.fromiter(self.entries, dtype=np.float64, count=len(self.entries)))
+        retained = len(entries)
+        if self.is_empty or retained == 0:
+            return np.zeros(ks.shape)
+        
+        # A k'-sketch overflowed if it saw more than k' distinct hashes
+        overflowed = (retained > ks) | (self.theta < 1.0)
+        count = np.where(overflowed, np.minimum(ks, retained), retained)
+        theta = np.where(
+            retained > ks,
+            entries[np.minimum(ks, retained - 1)],
+            np.where(overflowed, self.theta, 1.0)
+        )
+        
+        with np.errstate(divide='ignore'):
+            return np.where(
+                (count < ks) & (theta < 1.0),
+                count / theta,
+                np.where(theta > 0, ks / theta, np.inf)
+            )
+    
+    def count(self):
+        """Alias of cardinality(), matching the HLL/FM/LC interface."""
+        return self.cardinality()
+    
     def get_entries(self):
-        """Return current entries (for debugging/analysis)."""
-        return list(self.entries)
+        """Return current entries, sorted (for debugging/analysis)."""
+        return sorted(self.entries)
     
     def get_theta(self):
         """Return current theta value."""
@@ -141,16 +241,14 @@ class ThetaSketch:
         # Create new sketch
         merged = ThetaSketch(k=self.k)
         
-        # Add entries from both sketches
-        for hash_val, item in self.entries:
-            merged.entries.add((hash_val, item))
-        
-        for hash_val, item in other.entries:
-            merged.entries.add((hash_val, item))
-        
         # Update theta to minimum
         merged.theta = min(self.theta, other.theta)
         
+        # Add entries from both sketches below the common theta; an entry
+        # at or above it was dropped (or never seen) by the other sketch
+        merged.entries.update(v for v in self.entries if v < merged.theta)
+        merged.entries.update(v for v in other.entries if v < merged.theta)
+        
         # Resize if necessary
         if len(merged.entries) > self.k:
             merged._resize()
@@ -159,6 +257,32 @@ class ThetaSketch:
         merged.is_empty = (len(merged.entries) == 0)
         
         return merged
+    
+    def to_bytes(self):
+        """
+        Compact serialization: k and theta, then the retained hash values
+        (sorted float64).
+        
+        Returns:
+            bytes (see from_bytes)
+        """
+        header = struct.pack('<Qd', self.k, self.theta)
+        return header + np.array(sorted(self.entries), dtype=np.float64).tobytes()
+    
+    def serialized_size(self):
+        """Length of to_bytes(), without serializing."""
+        return 16 + 8 * len(self.entries)
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a sketch serialized with to_bytes()."""
+        k, theta = struct.unpack_from('<Qd', data)
+        sketch = cls(k=k)
+        sketch.theta = theta
+        sketch.entries = set(np.frombuffer(data, dtype=np.float64, offset=16).tolist())
+        sketch.num_retained = len(sketch.entries)
+        sketch.is_empty = not sketch.entries
+        return sketch
 
 
 class ThetaSketchUnion:
@@ -190,12 +314,14 @@ class ThetaSketchUnion:
             raise TypeError("Can only update with ThetaSketch")
         
         # Add all entries that are below combined theta
-        for hash_val, item in sketch.entries:
+        for hash_val in sketch.entries:
             if hash_val < self.theta:
-                self.entries.add((hash_val, item))
+                self.entries.add(hash_val)
         
-        # Update theta
-        self.theta = min(self.theta, sketch.theta)
+        # Update theta, dropping earlier entries the new theta excludes
+        if sketch.theta < self.theta:
+            self.theta = sketch.theta
+            self.entries = {v for v in self.entries if v < self.theta}
         
         # Resize if necessary
         if len(self.entries) > self.k:
@@ -204,11 +330,11 @@ class ThetaSketchUnion:
     def _resize(self):
         """Reduce to k entries."""
         if len(self.entries) > self.k:
-            sorted_entries = sorted(self.entries, key=lambda x: x[0])
+            sorted_entries = sorted(self.entries)
             self.entries = set(sorted_entries[:self.k])
             
             if len(self.entries) == self.k and len(sorted_entries) > self.k:
-                self.theta = sorted_entries[self.k][0]
+                self.theta = sorted_entries[self.k]
     
     def get_result(self):
         """